@@ -0,0 +1,139 @@
+"""
+A simulated screen for benchmarks: Wnck and Gdk windows answering from memory and
+counting the requests that would reach the X server
+"""
+from typing import Dict, List, NamedTuple
+from gi.repository import Gdk
+
+# frame deltas as (x, y, w, h) between the frame and the client window
+DECORATIONS = {
+	'ssd': (True, Gdk.WMDecoration.ALL, (0, 28, 0, 28)),
+	'csd': (True, Gdk.WMDecoration(0), (-20, -20, 40, 40)),
+	'none': (True, Gdk.WMDecoration.BORDER, (1, 1, 2, 2)),
+}
+
+
+class Rectangle(NamedTuple):
+	x: int
+	y: int
+	width: int
+	height: int
+
+
+class Counter:
+
+	def __init__(self):
+		self.requests: Dict[str, int] = {'configure': 0, 'flush': 0, 'sync': 0, 'read': 0}
+
+	def count(self, request: str):
+		self.requests[request] += 1
+
+	def total(self) -> int:
+		return sum(self.requests.values())
+
+	def reset(self):
+		for request in self.requests:
+			self.requests[request] = 0
+
+
+class FakeWnckWindow:
+
+	def __init__(self, xid: int, counter: Counter, decoration: str = 'ssd', min_height: int = 0):
+		self.xid = xid
+		self.counter = counter
+		self.is_decorated, self.decorations, self.delta = DECORATIONS[decoration]
+		self.min_height = min_height
+		self.geometry = (0, 0, 100, 100)
+		self.configured: List[int] = None
+
+	def get_xid(self):
+		return self.xid
+
+	def get_name(self):
+		return 'window {}'.format(self.xid)
+
+	def get_pid(self):
+		return 0
+
+	def is_skip_tasklist(self):
+		return False
+
+	def is_minimized(self):
+		return False
+
+	def is_maximized(self):
+		return False
+
+	def is_maximized_vertically(self):
+		return False
+
+	def is_maximized_horizontally(self):
+		return False
+
+	def unmaximize(self):
+		self.counter.count('configure')
+
+	def get_geometry(self):
+		return self.geometry
+
+	def get_client_window_geometry(self):
+		x, y, w, h = self.geometry
+		dx, dy, dw, dh = self.delta
+		return x + dx, y + dy, w - dw, h - dh
+
+	def set_geometry(self, gravity, mask, x, y, w, h):
+		self.counter.count('configure')
+		self.geometry = (x, y, w, max(h, self.min_height))
+		if self.configured is not None:
+			self.configured.append(self.xid)
+
+
+class FakeGdkDisplay:
+	"""
+	A single monitor display, answering for the monitor too
+	"""
+
+	def __init__(self, workarea: Rectangle):
+		self.workarea = workarea
+
+	def get_monitor_at_window(self, window):
+		return self
+
+	def get_workarea(self):
+		return self.workarea
+
+
+class FakeGdkWindow:
+
+	def __init__(self, window: FakeWnckWindow, display: FakeGdkDisplay = None):
+		self.window = window
+		self.display = display
+
+	def get_display(self):
+		return self.display
+
+	def get_geometry(self):
+		self.window.counter.count('read')
+		return self.window.get_client_window_geometry()
+
+	def get_decorations(self):
+		self.window.counter.count('read')
+		return self.window.is_decorated, self.window.decorations
+
+
+class FakeTrap:
+	"""
+	Each X error trap pop is a round trip to the server
+	"""
+
+	def __init__(self, counter: Counter):
+		self.counter = counter
+
+	def __call__(self):
+		return self
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, type, exception, exception_traceback):
+		self.counter.count('sync')
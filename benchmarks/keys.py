@@ -0,0 +1,82 @@
+"""
+Key source benchmark: binds a key with each KeyboardListener source on Xvfb, presses it through XTest,
+optionally amid unbound typing, and reports the latency from the press to the listener callback.
+
+	python3 -m benchmarks.keys --presses 200 --typing 20
+"""
+import argparse
+import os
+import queue
+import time
+from typing import List
+
+from Xlib import X, XK
+from Xlib.display import Display
+from Xlib.ext import xtest
+
+from benchmarks.latency import start_display
+
+TYPING = 'abcdefghiklmnopqrstuvwxyz'
+
+
+def bench(source_name: str, presses: int, typing: int) -> List[float]:
+	import pocoy.keyboard as keyboard
+	arrivals = queue.Queue()
+	listener = keyboard.KeyboardListener(
+		callback=lambda key, event, multiplier: arrivals.put(time.perf_counter()), on_error=lambda: None)
+	display = Display()
+	code = display.keysym_to_keycode(XK.string_to_keysym('j'))
+	control = display.keysym_to_keycode(XK.string_to_keysym('Control_L'))
+	typing_codes = [display.keysym_to_keycode(XK.string_to_keysym(c)) for c in TYPING]
+	listener.add(keyboard.Key(code=code, mask=X.ControlMask))
+	listener.start(source=keyboard.SOURCES[source_name]())
+	time.sleep(0.2)
+
+	latencies = []
+	try:
+		for i in range(presses):
+			for typed in range(typing):
+				typing_code = typing_codes[(i + typed) % len(typing_codes)]
+				xtest.fake_input(display, X.KeyPress, typing_code)
+				xtest.fake_input(display, X.KeyRelease, typing_code)
+			display.sync()
+			start = time.perf_counter()
+			xtest.fake_input(display, X.KeyPress, control)
+			xtest.fake_input(display, X.KeyPress, code)
+			xtest.fake_input(display, X.KeyRelease, code)
+			xtest.fake_input(display, X.KeyRelease, control)
+			display.sync()
+			try:
+				latencies.append(arrivals.get(timeout=1) - start)
+			except queue.Empty:
+				pass
+	finally:
+		listener.stop()
+		display.close()
+	return latencies
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Key press to listener callback latency, per key source')
+	parser.add_argument('--presses', type=int, default=200, help='bound key presses per source')
+	parser.add_argument('--typing', type=int, default=0, help='unbound key presses before each bound one')
+	parser.add_argument('--sources', default='xlib,record', help='comma separated key sources')
+	args = parser.parse_args()
+
+	xvfb, display_name = start_display('1024x768')
+	os.environ['DISPLAY'] = display_name
+	try:
+		import pocoy.tracing as tracing
+		print('{:8} {:>8} {:>8} {:>8} {:>8} {:>8}'.format('source', 'received', 'p50', 'p95', 'p99', 'max'))
+		for source_name in args.sources.split(','):
+			latencies = sorted(latency * 1000 for latency in bench(source_name, args.presses, args.typing))
+			print('{:8} {:8d} {:8.3f} {:8.3f} {:8.3f} {:8.3f} ms'.format(
+				source_name, len(latencies), tracing.percentile(latencies, 50), tracing.percentile(latencies, 95),
+				tracing.percentile(latencies, 99), latencies[-1] if latencies else 0))
+	finally:
+		xvfb.terminate()
+		xvfb.wait()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,336 @@
+"""
+End-to-end latency benchmark: starts Xvfb, a window manager, dummy X clients and the pocoy service,
+injects the keys bound in the config through XTest and measures the time until the clients stop
+receiving CONFIGURE (or focus) events. Results are printed as JSON so they can be tracked across commits.
+
+	python3 -m benchmarks.latency --clients 10 --iterations 50 --wm openbox --output latency.json
+
+Needs Xvfb, dbus-daemon and an EWMH window manager in the PATH.
+"""
+import argparse
+import json
+import os
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Dict, Tuple
+
+from Xlib import X
+from Xlib.display import Display
+from Xlib.ext import xtest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ['zoom', 'pushstack', 'setlayout', 'focusstack']
+# order of the masks in the modifier mapping
+MODIFIER_MASKS = [X.ShiftMask, X.LockMask, X.ControlMask, X.Mod1Mask, X.Mod2Mask, X.Mod3Mask, X.Mod4Mask, X.Mod5Mask]
+# focus changes caused by the grabs of the key listener itself are not the outcome of a command
+FOCUS_MODES = (X.NotifyNormal, X.NotifyWhileGrabbed)
+
+
+class Client:
+	"""
+	A dummy X client owning a single top level window
+	"""
+
+	def __init__(self, display_name: str, index: int):
+		self.display = Display(display_name)
+		self.window = self.display.screen().root.create_window(
+			0, 0, 400, 300, 0, X.CopyFromParent, X.InputOutput, X.CopyFromParent,
+			background_pixel=self.display.screen().white_pixel,
+			event_mask=X.StructureNotifyMask | X.FocusChangeMask)
+		self.window.set_wm_name('pocoy-latency-{}'.format(index))
+		self.window.set_wm_class('pocoy-latency', 'PocoyLatency')
+		self.window.map()
+		self.display.flush()
+
+	def fileno(self):
+		return self.display.fileno()
+
+	def close(self):
+		self.display.close()
+
+
+class Session:
+
+	def __init__(self, display_name: str, clients: List[Client]):
+		self.clients = clients
+		self.display = Display(display_name)
+		if not self.display.has_extension('XTEST'):
+			raise Exception('The X server has no XTEST extension')
+		self.modifiers = [next((code for code in codes if code), 0) for codes in self.display.get_modifier_mapping()]
+
+	def press(self, code: int, mask: int):
+		modifiers = [self.modifiers[i] for i, modifier_mask in enumerate(MODIFIER_MASKS) if mask & modifier_mask]
+		for modifier in modifiers:
+			xtest.fake_input(self.display, X.KeyPress, modifier)
+		xtest.fake_input(self.display, X.KeyPress, code)
+		xtest.fake_input(self.display, X.KeyRelease, code)
+		for modifier in reversed(modifiers):
+			xtest.fake_input(self.display, X.KeyRelease, modifier)
+		self.display.sync()
+
+	def read(self, timeout: float) -> Tuple[int, int]:
+		"""
+		Waits up to timeout seconds for events, returning how many CONFIGURE and focus events arrived
+		"""
+		ready = [client for client in self.clients if client.display.pending_events()]
+		if not ready:
+			ready, _, _ = select.select(self.clients, [], [], max(0.0, timeout))
+		configures = focuses = 0
+		for client in ready:
+			while client.display.pending_events():
+				event = client.display.next_event()
+				if event.type == X.ConfigureNotify:
+					configures += 1
+				elif event.type == X.FocusIn and event.mode in FOCUS_MODES:
+					focuses += 1
+		return configures, focuses
+
+	def settle(self, start: float, quiet: float, timeout: float) -> Tuple[float, int]:
+		"""
+		Seconds from start to the last event followed by a quiet period, None if nothing happened
+		"""
+		last = None
+		configures = 0
+		deadline = start + timeout
+		while True:
+			now = time.perf_counter()
+			limit = min(deadline, last + quiet) if last else deadline
+			if now >= limit:
+				return (last - start if last else None), configures
+			configure_count, focus_count = self.read(limit - now)
+			if configure_count or focus_count:
+				last = time.perf_counter()
+				configures += configure_count
+
+	def drain(self):
+		while self.read(0) != (0, 0):
+			pass
+
+	def measure(self, code: int, mask: int, quiet: float, timeout: float) -> Tuple[float, int]:
+		self.drain()
+		start = time.perf_counter()
+		self.press(code, mask)
+		return self.settle(start, quiet, timeout)
+
+
+class Layout:
+	"""
+	Follows the layout of the active monitor the way setlayout changes it: a key naming
+	the current layout switches back to the previous one instead
+	"""
+
+	def __init__(self, function_key: str):
+		self.current = function_key
+		self.last = None
+
+	def press(self, key):
+		requested = key.parameters[0] if key.parameters else self.last
+		if requested == self.current:
+			requested = self.last
+		if requested != self.current:
+			self.last, self.current = self.current, requested
+
+
+#
+# Environment
+#
+def start_display(screen: str) -> Tuple[subprocess.Popen, str]:
+	read_end, write_end = os.pipe()
+	xvfb = subprocess.Popen(
+		['Xvfb', '-displayfd', str(write_end), '-screen', '0', screen + 'x24', '-nolisten', 'tcp'],
+		pass_fds=(write_end,))
+	os.close(write_end)
+	with os.fdopen(read_end) as display_fd:
+		number = display_fd.readline().strip()
+	if not number:
+		raise Exception('Xvfb did not start')
+	return xvfb, ':' + number
+
+
+def start_bus() -> Tuple[int, str]:
+	output = subprocess.run(
+		['dbus-daemon', '--session', '--fork', '--print-address=1', '--print-pid=1'],
+		check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+	return int(output[1]), output[0]
+
+
+def wait_window_manager(display_name: str, timeout: float):
+	"""
+	Waits for the window manager to announce itself on the root window, as EWMH requires
+	"""
+	display = Display(display_name)
+	check = display.intern_atom('_NET_SUPPORTING_WM_CHECK')
+	deadline = time.perf_counter() + timeout
+	try:
+		while not display.screen().root.get_full_property(check, X.AnyPropertyType):
+			if time.perf_counter() > deadline:
+				raise Exception('No EWMH window manager running on {}'.format(display_name))
+			time.sleep(0.05)
+	finally:
+		display.close()
+
+
+def scenario_keys(config_module) -> Dict[str, List]:
+	"""
+	The root keys bound to each scenario, layouts restricted to the tiling ones so each press changes the screen
+	"""
+	keys = {scenario: [] for scenario in SCENARIOS}
+	for key in config_module.keys:
+		name = getattr(key.function, '__name__', None)
+		if name not in keys:
+			continue
+		if name == 'setlayout' and not (key.parameters and key.parameters[0]):
+			continue
+		keys[name].append(key)
+	return keys
+
+
+def layout_key(config_module, function_key: str):
+	for key in config_module.keys:
+		if getattr(key.function, '__name__', None) == 'setlayout' and key.parameters == [function_key]:
+			return key
+	raise Exception('No key bound to the layout: {}'.format(function_key))
+
+
+def summary(latencies: List[float], configures: List[int], missed: int) -> Dict:
+	import pocoy.tracing as tracing
+	ordered = sorted(latency * 1000 for latency in latencies)
+	return {
+		'samples': len(ordered),
+		'missed': missed,
+		'p50': tracing.percentile(ordered, 50),
+		'p95': tracing.percentile(ordered, 95),
+		'p99': tracing.percentile(ordered, 99),
+		'mean': sum(ordered) / len(ordered) if ordered else 0,
+		'max': ordered[-1] if ordered else 0,
+		'configure_events': sum(configures) / len(configures) if configures else 0,
+	}
+
+
+def revision() -> str:
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+			universal_newlines=True).stdout.strip()
+	except OSError:
+		return None
+
+
+def run(args) -> Dict:
+	processes: List[subprocess.Popen] = []
+	clients: List[Client] = []
+	bus_pid = None
+	home = tempfile.TemporaryDirectory(prefix='pocoy-latency-')
+	try:
+		xvfb, display_name = start_display(args.screen)
+		processes.append(xvfb)
+		bus_pid, bus_address = start_bus()
+		environment = dict(
+			os.environ, DISPLAY=display_name, DBUS_SESSION_BUS_ADDRESS=bus_address, PYTHONPATH=ROOT,
+			XDG_CONFIG_HOME=os.path.join(home.name, 'config'), XDG_CACHE_HOME=os.path.join(home.name, 'cache'))
+		os.environ.update(environment)
+
+		if args.config:
+			os.makedirs(os.path.join(home.name, 'config', 'pocoy'))
+			shutil.copy(args.config, os.path.join(home.name, 'config', 'pocoy', 'config.py'))
+
+		processes.append(subprocess.Popen(args.wm.split(), env=environment))
+		wait_window_manager(display_name, args.startup)
+		clients = [Client(display_name, i) for i in range(args.clients)]
+		session = Session(display_name, clients)
+
+		# reading the config after the environment is set, the key codes depend on the display keymap
+		import pocoy.service
+		import pocoy.state as state
+		state.load()
+		config_module = state.get_config_module()
+		layout = Layout(state.get_workspace_config()['workspaces'][0]['monitors'][0]['function'])
+
+		command = [sys.executable, os.path.join(ROOT, 'bin', 'pocoy')]
+		processes.append(subprocess.Popen(command, env=environment))
+		session.settle(time.perf_counter(), 1, args.startup)
+
+		tiling = layout_key(config_module, args.layout)
+		quiet, timeout = args.quiet / 1000, args.timeout / 1000
+		scenarios = {}
+		for scenario, keys in scenario_keys(config_module).items():
+			if not keys:
+				continue
+			# pressing the layout key again would switch back to the previous layout
+			if layout.current != args.layout:
+				session.measure(tiling.code, tiling.mask, quiet, timeout)
+				layout.press(tiling)
+			latencies, configures, missed = [], [], 0
+			for i in range(args.iterations):
+				key = keys[i % len(keys)]
+				latency, configure_count = session.measure(key.code, key.mask, quiet, timeout)
+				if scenario == 'setlayout':
+					layout.press(key)
+				if latency is None:
+					missed += 1
+				else:
+					latencies.append(latency)
+					configures.append(configure_count)
+			scenarios[scenario] = summary(latencies, configures, missed)
+
+		stats = subprocess.run(
+			command + ['--stats'], env=environment, stdout=subprocess.PIPE, universal_newlines=True).stdout
+		return {
+			'revision': revision(),
+			'date': datetime.now().isoformat(),
+			'wm': args.wm,
+			'screen': args.screen,
+			'clients': args.clients,
+			'iterations': args.iterations,
+			'layout': args.layout,
+			'quiet_ms': args.quiet,
+			'scenarios': scenarios,
+			'service_stats': stats,
+		}
+	finally:
+		for client in clients:
+			client.close()
+		for process in reversed(processes):
+			process.terminate()
+			try:
+				process.wait(5)
+			except subprocess.TimeoutExpired:
+				process.kill()
+		if bus_pid:
+			os.kill(bus_pid, 15)
+		home.cleanup()
+
+
+def main():
+	parser = argparse.ArgumentParser(description='End-to-end key to settled layout latency benchmark')
+	parser.add_argument('--clients', type=int, default=10, help='dummy X clients to open')
+	parser.add_argument('--iterations', type=int, default=50, help='key presses per scenario')
+	parser.add_argument('--screen', default='1920x1080', help='Xvfb screen size')
+	parser.add_argument('--wm', default='openbox', help='window manager command line')
+	parser.add_argument('--layout', default='T', help='tiling layout set before each scenario')
+	parser.add_argument('--config', default=None, help='config module to run the service with, the default config otherwise')
+	parser.add_argument('--quiet', type=float, default=100, help='milliseconds without events for the screen to settle')
+	parser.add_argument('--timeout', type=float, default=2000, help='milliseconds to wait for each key')
+	parser.add_argument('--startup', type=float, default=10, help='seconds to wait for the service to lay out the clients')
+	parser.add_argument('--output', default=None, help='file to write the JSON results, stdout by default')
+	args = parser.parse_args()
+
+	for program in ('Xvfb', 'dbus-daemon', args.wm.split()[0]):
+		if not shutil.which(program):
+			parser.error('{} is not installed'.format(program))
+
+	results = json.dumps(run(args), indent=2)
+	if args.output:
+		with open(args.output, 'w') as output:
+			output.write(results + '\n')
+	else:
+		print(results)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,129 @@
+"""
+Headless layout benchmark: runs every layout and Monitor.apply against a simulated screen
+and reports operations per second and the X requests each operation would send, next to
+how fast the pure solver alone turns the clients into rectangles.
+
+	python3 -m benchmarks.layout --clients 1,10,100,500 --monitors 1,2 --decoration ssd
+"""
+import argparse
+import time
+from typing import Dict, List
+
+import pocoy.layout as layout
+import pocoy.model as model
+import pocoy.state as state
+import pocoy.wm as wm
+from pocoy.model import Monitor
+from benchmarks.fake import Counter, FakeWnckWindow, FakeGdkWindow, FakeGdkDisplay, FakeTrap, Rectangle
+
+WIDTH = 1920
+HEIGHT = 1080
+
+
+class Screen:
+
+	def __init__(self, clients: int, monitor_count: int, decoration: str, min_height: int):
+		self.counter = Counter()
+		self.windows: Dict[int, FakeWnckWindow] = {}
+		self.monitors: List[Monitor] = []
+		for i in range(monitor_count):
+			monitor = Monitor((0, 'bench-{}'.format(i)), nmaster=1, mfact=0.55)
+			monitor.set_rectangle(Rectangle(WIDTH * i, 0, WIDTH, HEIGHT))
+			self.monitors.append(monitor)
+		for xid in range(1, clients + 1):
+			window = FakeWnckWindow(xid, self.counter, decoration=decoration, min_height=min_height)
+			self.windows[xid] = window
+			self.monitors[xid % monitor_count].clients.append(xid)
+
+	def install(self):
+		displays = [FakeGdkDisplay(Rectangle(WIDTH * i, 0, WIDTH, HEIGHT)) for i in range(len(self.monitors))]
+		gdk_windows = {
+			xid: FakeGdkWindow(window, displays[xid % len(displays)]) for xid, window in self.windows.items()}
+		wm.window_for = lambda xid: gdk_windows[xid]
+		wm.Trap = FakeTrap(self.counter)
+		layout.flush = lambda: self.counter.count('flush')
+		model.windows.window_by_xid = self.windows
+
+	def deliver_configure_events(self):
+		"""
+		What the controller does for each CONFIGURE the server sends back
+		"""
+		for window in self.windows.values():
+			configured, window.configured = window.configured, []
+			for xid in configured or []:
+				wm.settle(window)
+				layout.reconcile(xid)
+
+	def forget(self):
+		for xid in self.windows:
+			layout.forget(xid)
+			wm.forget(xid)
+
+
+def bench(screen: Screen, function_key: str, cold: bool, duration: float):
+	for monitor in screen.monitors:
+		monitor.function_key = function_key
+	for window in screen.windows.values():
+		window.configured = []
+
+	operations = 0
+	screen.counter.reset()
+	start = time.perf_counter()
+	while time.perf_counter() - start < duration:
+		if cold:
+			screen.forget()
+		for monitor in screen.monitors:
+			monitor.apply()
+		screen.deliver_configure_events()
+		operations += 1
+	elapsed = time.perf_counter() - start
+
+	requests = {name: count / operations for name, count in screen.counter.requests.items()}
+	return operations / elapsed, requests
+
+
+def bench_solver(function_key: str, clients: int, duration: float) -> float:
+	"""
+	Rectangles of every client solved per second, with the solver caches emptied each time
+	"""
+	solver = getattr(layout, layout.FUNCTIONS_MAP[function_key].__name__ + '_strips')
+	area = (0, 0, WIDTH, HEIGHT)
+	gap = state.get_inner_gap()
+	operations = 0
+	start = time.perf_counter()
+	while time.perf_counter() - start < duration:
+		layout.solve.cache_clear()
+		layout.strip_rectangles.cache_clear()
+		layout.rectangles(solver, clients, area, 1, 0.55, gap)
+		operations += 1
+	return operations / (time.perf_counter() - start)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Headless layout benchmark')
+	parser.add_argument('--clients', default='1,10,50,100,500', help='comma separated client counts')
+	parser.add_argument('--monitors', default='1,2', help='comma separated monitor counts')
+	parser.add_argument('--decoration', default='ssd', choices=['ssd', 'csd', 'none'])
+	parser.add_argument('--min-height', type=int, default=0, help='smallest height windows accept')
+	parser.add_argument('--duration', type=float, default=0.2, help='seconds per case')
+	args = parser.parse_args()
+
+	state.loaded_parameters = dict(state.DEFAULT_PARAMETERS)
+	print('{:3} {:>7} {:>8} {:5} {:>11} {:>10} {:>7} {:>7} {:>7} {:>11}'.format(
+		'', 'clients', 'monitors', 'cache', 'apply/s', 'configure', 'flush', 'sync', 'read', 'solve/s'))
+	for function_key in filter(None, layout.FUNCTIONS_MAP.keys()):
+		for clients in map(int, args.clients.split(',')):
+			solve_rate = bench_solver(function_key, clients, args.duration)
+			for monitor_count in map(int, args.monitors.split(',')):
+				screen = Screen(clients, monitor_count, args.decoration, args.min_height)
+				screen.install()
+				for cold in (True, False):
+					rate, requests = bench(screen, function_key, cold, args.duration)
+					print('{:3} {:7d} {:8d} {:5} {:11.1f} {:10.1f} {:7.1f} {:7.1f} {:7.1f} {:11.1f}'.format(
+						function_key, clients, monitor_count, 'cold' if cold else 'warm', rate,
+						requests['configure'], requests['flush'], requests['sync'], requests['read'], solve_rate))
+				screen.forget()
+
+
+if __name__ == '__main__':
+	main()
@@ -70,6 +70,8 @@ names = [
 	Name('buffer',      windows.activate, alias='b', complete=windows.complete),
 	Name('maximize',    active_window.maximize, alias='ma'),
 	Name('reload',      service.reload),
+	Name('stats',       service.stats),
+	Name('profile',     service.profile, complete=service.complete_profile),
 	Name('quit',        active_window.minimize, alias='q'),
 	Name('only',        active_window.only, alias='on'),
 	Name('gap',         active_monitor.gap, complete=active_monitor.complete_gap_options),
@@ -14,39 +14,64 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import time
 import traceback
-from pocoy import wm, scratchpads
+from pocoy import wm, scratchpads, layout, state, decoration, profiling
 from pocoy.model import Monitors, Windows
-from pocoy.wm import DirtyState, is_managed, gdk_window_for, Trap, resize
+from pocoy.wm import DirtyState, is_managed, gdk_window_for, Trap, SnapshotScope, resize
 from functools import reduce
-from typing import List, Dict, Callable
-from gi.repository import Wnck, Gdk, Gtk
+from typing import List, Dict, Tuple, Callable
+from gi.repository import Wnck, Gdk, Gtk, GLib
 
 
 windows: Windows = None
 monitors: Monitors = None
 screen_handlers: List[int] = []
-handlers_by_xid: Dict[int, int] = {}
+gdk_screen_handlers: List[int] = []
+handlers_by_xid: Dict[int, List[int]] = {}
 on_layout_change: [Callable] = []
 mapped = set()
 configured = set()
+pending_relayouts: Dict[Tuple, bool] = {}
+pending_decoration = False
+relayout_source: int = None
+relayout_deadline: float = None
+relayout_counter = {'requested': 0, 'applied': 0, 'coalesced': 0}
+# how many times the debounce a burst of windows can postpone its relayout
+RELAYOUT_MAX_WAIT = 4
 
 
 def resilient(function):
 	def decorator(*args, **kwargs):
 		try:
-			with Trap():
-				function(*args, **kwargs)
+			with Trap(), SnapshotScope():
+				profiling.profile_handler(function.__name__, function, *args, **kwargs)
 		except DirtyState as e:
 			if not e.__cause__ and not e.__context__:
 				print('During execution of \'{}\':'.format(function.__name__))
 			traceback.print_exc()
+			windows.invalidate()
 
 		finally:
 			windows.clean()
 	return decorator
 
 
+def incremental(function):
+	"""
+	Rebuilds the model on the next read if an incremental update fails. Unlike resilient, it does
+	not trap X errors: geometry changes are too frequent to pay the trap round-trip each
+	"""
+	def decorator(*args, **kwargs):
+		try:
+			function(*args, **kwargs)
+		except Exception:
+			print('During execution of \'{}\':'.format(function.__name__))
+			traceback.print_exc()
+			windows.invalidate()
+	return decorator
+
+
 def connect_to(screen: Wnck.Screen, model_windows: Windows, model_monitors: Monitors):
 	global windows, monitors
 	windows = model_windows
@@ -54,58 +79,86 @@ def connect_to(screen: Wnck.Screen, model_windows: Windows, model_monitors: Moni
 	opened_handler_id = screen.connect("window-opened", _window_opened)
 	closed_handler_id = screen.connect("window-closed", _window_closed)
 	screen_handlers.extend([opened_handler_id, closed_handler_id])
-	_install_present_window_handlers(screen)
+	for signal in ('active-workspace-changed', 'workspace-created', 'workspace-destroyed', 'viewports-changed'):
+		screen_handlers.append(screen.connect(signal, _screen_changed))
+	gdk_screen_handlers.append(Gdk.Screen.get_default().connect('monitors-changed', _screen_changed))
+	for window in screen.get_windows():
+		_install_window_handlers(window)
 	Gdk.Event.handler_set(_handle_x_event)
 
 
-def _install_present_window_handlers(screen: Wnck.Screen):
-	for window in screen.get_windows():
-		if window.get_xid() not in handlers_by_xid and is_managed(window):
-			handler_id = window.connect("state-changed", _state_changed)
-			handlers_by_xid[window.get_xid()] = handler_id
+def _install_window_handlers(window: Wnck.Window):
+	if window.get_xid() in handlers_by_xid:
+		return
+	handlers_by_xid[window.get_xid()] = [
+		window.connect("state-changed", _state_changed),
+		window.connect("geometry-changed", _geometry_changed),
+		window.connect("workspace-changed", _workspace_changed),
+	]
 
 
 def disconnect_from(screen: Wnck.Screen):
 	windows.read(screen, force_update=False)
 	for xid in handlers_by_xid.keys():
 		if xid in windows.window_by_xid:
-			windows.window_by_xid[xid].disconnect(handlers_by_xid[xid])
+			for handler_id in handlers_by_xid[xid]:
+				windows.window_by_xid[xid].disconnect(handler_id)
+	handlers_by_xid.clear()
 	for handler_id in screen_handlers:
 		screen.disconnect(handler_id)
+	del screen_handlers[:]
+	for handler_id in gdk_screen_handlers:
+		Gdk.Screen.get_default().disconnect(handler_id)
+	del gdk_screen_handlers[:]
+	cancel_relayout()
+	windows.invalidate()
+
+
+def _screen_changed(screen, *args):
+	windows.invalidate()
+
+
+@incremental
+def _geometry_changed(window: Wnck.Window):
+	windows.update(window)
+
+
+@incremental
+def _workspace_changed(window: Wnck.Window):
+	windows.update(window)
 
 
 @resilient
 def _window_opened(screen: Wnck.Screen, window: Wnck.Window):
 	gdk_window_for(window).flush()
-	windows.read(screen, force_update=False)
-	_install_present_window_handlers(screen)
+	windows.add(window)
+	_install_window_handlers(window)
 	if window.get_name() in scratchpads.names():
 		scratchpad = scratchpads.get(window.get_name())
 		primary = Gdk.Display.get_default().get_primary_monitor().get_workarea()
 		resize(window, rectangle=primary, l=scratchpad.l, t=scratchpad.t, w=scratchpad.w, h=scratchpad.h)
 	elif is_managed(window):
 		monitor = monitors.get_active(window)
-		clients = monitor.clients
-		copy = clients.copy()
-		clients.sort(key=lambda xid: -1 if xid == window.get_xid() else copy.index(xid))
+		if window.get_xid() in monitor.clients:
+			monitor.clients.promote(window.get_xid())
 		notify_layout_change()
 		if monitor.function_key:
-			monitor.apply(unmaximize=True)
-			windows.apply_decoration_config()
+			schedule_relayout(monitor, unmaximize=True, decorate=True)
 
 
 @resilient
 def _state_changed(window: Wnck.Window, changed_mask, new_state):
+	windows.update(window)
+	if not is_managed(window):
+		return
 	maximization = changed_mask & Wnck.WindowState.MAXIMIZED_HORIZONTALLY or changed_mask & Wnck.WindowState.MAXIMIZED_VERTICALLY
 	if maximization and new_state and monitors.get_active(window).function_key:
 		window.unmaximize()
-	if changed_mask & Wnck.WindowState.MINIMIZED and is_managed(window):
-		windows.read(window.get_screen(), force_update=False)
+		wm.forget_snapshot(window)
+	if changed_mask & Wnck.WindowState.MINIMIZED:
 		monitor = monitors.get_active(window)
-		clients = monitor.clients
-		if window.get_xid() in clients:
-			old_index = clients.index(window.get_xid())
-			clients.insert(0, clients.pop(old_index))
+		if window.get_xid() in monitor.clients:
+			monitor.clients.promote(window.get_xid())
 		monitor.apply()
 		notify_layout_change()
 
@@ -113,12 +166,17 @@ def _state_changed(window: Wnck.Window, changed_mask, new_state):
 @resilient
 def _window_closed(screen: Wnck.Screen, window):
 	if window.get_xid() in handlers_by_xid:
-		window.disconnect(handlers_by_xid[window.get_xid()])
+		for handler_id in handlers_by_xid[window.get_xid()]:
+			window.disconnect(handler_id)
 		del handlers_by_xid[window.get_xid()]
 	monitor = monitors.of_client(window.get_xid())
+	windows.remove(window.get_xid())
+	# a column awaiting the window moves on to the next one before the layout forgets it
+	wm.forget(window.get_xid())
+	layout.forget(window.get_xid())
+	decoration.forget(window.get_xid())
 	if monitor:
-		windows.read(screen, force_update=False)
-		monitor.apply()
+		schedule_relayout(monitor)
 
 
 @resilient
@@ -127,12 +185,21 @@ def _handle_x_event(event: Gdk.Event):
 	event_type = event.get_event_type()
 	if event_type in (Gdk.EventType.MAP, Gdk.EventType.CONFIGURE) and event.window:
 		(configured if event_type == Gdk.EventType.CONFIGURE else mapped).add(event.window.get_xid())
+		if event_type == Gdk.EventType.CONFIGURE:
+			if event.window.get_xid() in windows.window_by_xid:
+				wm.settle(windows.window_by_xid[event.window.get_xid()])
+			wm.acknowledge_configure(event.window.get_xid())
+			layout.reconcile(event.window.get_xid())
 	elif event_type == Gdk.EventType.PROPERTY_NOTIFY:
+		atom_name = event.property.atom.name()
+		if atom_name == '_NET_WORKAREA':
+			windows.invalidate()
+			return
+		if atom_name not in ('_GTK_FRAME_EXTENTS', '_NET_FRAME_EXTENTS'):
+			return
 		xid = event.window.get_xid()
-		if (
-				xid in wm.geometry_cache and xid in windows.window_by_xid and not wm.adjustment_cache[xid]
-				and event.property.atom.name() in ('_GTK_FRAME_EXTENTS', '_NET_FRAME_EXTENTS')
-		):
+		wm.invalidate_decoration(xid)
+		if xid in wm.geometry_cache and xid in windows.window_by_xid and not wm.adjustment_cache[xid]:
 			event.window.flush()
 			ww: Wnck.Window = windows.window_by_xid[xid]
 			g: Gdk.Rectangle = ww.get_geometry()
@@ -150,6 +217,62 @@ def _handle_x_event(event: Gdk.Event):
 			wm.adjustment_cache[xid] = True
 
 
+#
+# RELAYOUT SCHEDULING
+#
+def schedule_relayout(monitor, unmaximize: bool = False, decorate: bool = False):
+	"""
+	Marks the monitor dirty to be laid out once when the main loop is idle, or once no window
+	opened or closed for the configured debounce, so a burst costs a single relayout.
+	A burst longer than RELAYOUT_MAX_WAIT times the debounce is laid out while it goes on
+	"""
+	global pending_decoration, relayout_source, relayout_deadline
+	relayout_counter['requested'] += 1
+	if monitor.id in pending_relayouts:
+		relayout_counter['coalesced'] += 1
+	pending_relayouts[monitor.id] = pending_relayouts.get(monitor.id, False) or unmaximize
+	pending_decoration = pending_decoration or decorate
+	debounce = state.get_relayout_debounce()
+	if not debounce:
+		if relayout_source is None:
+			relayout_source = GLib.idle_add(_relayout)
+		return
+	now = time.monotonic()
+	if relayout_source is None:
+		relayout_deadline = now + debounce * RELAYOUT_MAX_WAIT / 1000
+	else:
+		GLib.source_remove(relayout_source)
+	wait = min(debounce / 1000, relayout_deadline - now)
+	relayout_source = GLib.timeout_add(max(0, round(wait * 1000)), _relayout)
+
+
+def cancel_relayout():
+	global pending_decoration, relayout_source, relayout_deadline
+	if relayout_source is not None:
+		GLib.source_remove(relayout_source)
+	relayout_source = relayout_deadline = None
+	pending_relayouts.clear()
+	pending_decoration = False
+
+
+@resilient
+def _relayout():
+	global pending_decoration, relayout_source, relayout_deadline
+	relayout_source = relayout_deadline = None
+	relayouts = pending_relayouts.copy()
+	decorate = pending_decoration
+	pending_relayouts.clear()
+	pending_decoration = False
+
+	windows.sync(Wnck.Screen.get_default())
+	for monitor_id, unmaximize in relayouts.items():
+		if monitor_id in monitors.map:
+			relayout_counter['applied'] += 1
+			monitors.map[monitor_id].apply(unmaximize=unmaximize)
+	if decorate:
+		windows.apply_decoration_config()
+
+
 def notify_layout_change():
 	for callback in on_layout_change:
 		callback()
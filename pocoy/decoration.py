@@ -15,7 +15,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import pocoy.state as persistor
-from pocoy.wm import UserEvent, window_for
+from pocoy.wm import UserEvent, window_for, invalidate_decoration
 from gi.repository import Gdk
 from typing import List
 
@@ -32,9 +32,15 @@ DECORATION_MAP = {
 
 
 def remove(windows_xid: List[int]):
+	"""
+	Removes the title of the windows not yet undecorated, remembering their original decorations
+	"""
+	global dirty
 	original_decorations = persistor.get_decorations()
 
 	for xid in windows_xid:
+		if xid in undecorated:
+			continue
 
 		key = str(xid)
 		gdk_w = window_for(xid)
@@ -46,25 +52,56 @@ def remove(windows_xid: List[int]):
 		if has_title or ssd:
 			if key not in original_decorations:
 				original_decorations[key] = decorations if not ssd else Gdk.WMDecoration.ALL
+				dirty = True
 			gdk_w.set_decorations(Gdk.WMDecoration.BORDER)
+			invalidate_decoration(xid)
+		undecorated.add(xid)
 
-	persistor.persist_decorations(original_decorations)
+	persist()
 
 
 def restore(windows_xid: List[int]):
+	global dirty
 	original_decorations = persistor.get_decorations()
 	for xid in windows_xid:
+		undecorated.discard(xid)
 		key = str(xid)
 		if key in original_decorations:
 			window_for(xid).set_decorations(Gdk.WMDecoration(original_decorations[key]))
+			invalidate_decoration(xid)
 			del original_decorations[key]
-	persistor.persist_decorations(original_decorations)
+			dirty = True
+	persist()
 
 
 def clear():
+	global dirty
 	original_decorations = persistor.get_decorations()
+	dirty = dirty or len(original_decorations) > 0
 	original_decorations.clear()
-	persistor.persist_decorations(original_decorations)
+	undecorated.clear()
+	persist()
+
+
+def invalidate(xid: int):
+	"""
+	Forgets the window was undecorated, so the next removal checks it again
+	"""
+	undecorated.discard(xid)
+
+
+def forget(xid: int):
+	global dirty
+	undecorated.discard(xid)
+	if persistor.get_decorations().pop(str(xid), None) is not None:
+		dirty = True
+
+
+def persist():
+	global dirty
+	if dirty:
+		persistor.persist_decorations(persistor.get_decorations())
+		dirty = False
 
 
 def complete(c_in: UserEvent):
@@ -72,6 +109,8 @@ def complete(c_in: UserEvent):
 	return list(filter(lambda x: x.lower().startswith(option_name.lower().strip()), DECORATION_MAP.keys()))
 
 
+undecorated = set()
+dirty = False
 """
 ALL - all decorations should be applied.
 BORDER - a frame should be drawn around the window.
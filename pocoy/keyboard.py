@@ -14,12 +14,18 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-import threading, sys, Xlib
+import threading, struct, sys, Xlib
+from abc import ABC, abstractmethod
+import pocoy.tracing as tracing
+# the chord timer ungrabs from its own thread while the listener thread reads the connection,
+# python-xlib only locks its displays if this is imported before any of them is opened
+import Xlib.threaded
 from Xlib import X
 from Xlib.display import Display
+from Xlib.ext import record
 from Xlib.protocol import rq
 from gi.repository import Gtk, Gdk
-from typing import List, Dict, Tuple, Callable
+from typing import Dict, Tuple, Callable
 
 
 class Key:
@@ -77,22 +83,139 @@ class Context:
 		self.level = level
 		self.key = key
 		self.children: Dict[Tuple, Context] = {}
+		self.table: Dict[Tuple, Context] = {}
+		self.keyval: int = None
+		self.keymod: Gdk.ModifierType = None
 
 	def add(self, child):
 		self.children[child.key.id] = child
 		child.level = self.level + 1
 
+	def compile(self):
+		"""
+		Maps the raw (keycode, state) of each child, with every lock modifier variant, straight to the child,
+		translating its keyval upfront so the listener thread does not need to
+		"""
+		self.table = {}
+		for key_id, child in self.children.items():
+			code, mask = key_id
+			for variant in LOCK_VARIANTS:
+				self.table[(code, mask | variant)] = child
+			child.keymod = Gdk.ModifierType(mask)
+			_wasmapped, child.keyval, egroup, level, consumed = keymap.translate_keyboard_state(code, child.keymod, 0)
+			child.compile()
+
+	def lookup(self, code: int, state: int):
+		"""
+		The child bound to the key event, normalizing the state only if the raw one is not in the table
+		"""
+		child = self.table.get((code, state))
+		if child is None:
+			child = self.table.get((code, normalize_mask(state)))
+		return child
+
+
+class KeyEvent:
+	"""
+	The fields of a KeyPress the listener reads, for sources that decode the event themselves
+	"""
+	__slots__ = ['detail', 'state', 'time', 'keyval', 'keymod']
+
+	def __init__(self, detail: int, state: int, time: int):
+		self.detail = detail
+		self.state = state
+		self.time = time
+		self.keyval = None
+		self.keymod = None
+
+
+class KeySource(ABC):
+	"""
+	Where the listener thread reads the key presses from, the grabs are made by the listener connection regardless
+	"""
+
+	def open(self, listener):
+		self.listener = listener
+
+	@abstractmethod
+	def loop(self):
+		pass
+
+	def close(self):
+		pass
+
+
+class XlibSource(KeySource):
+	"""
+	Key presses delivered to the grabs, decoded by python-xlib
+	"""
+
+	def loop(self):
+		while not self.listener.stopped:
+			event = self.listener.connection.next_event()
+
+			if event.type == X.KeyPress:
+				self.listener.handle_keypress(event)
+
+
+class RecordSource(KeySource):
+	"""
+	Key presses read from an XRecord context and decoded straight from the wire, skipping the codes no root key
+	is bound to unless a combination is in progress. The record replies are read on the listener thread, so the
+	grabs they cause are made from it, and the events of the grab connection are discarded between them
+	"""
+
+	def open(self, listener):
+		super().open(listener)
+		self.codes = set(code for code, state in listener.root_context.table)
+		self.connection = Display()
+		if not self.connection.has_extension('RECORD'):
+			raise Exception('RECORD extension not found')
+		self.context = self.connection.record_create_context(0, [record.AllClients], RECORD_FILTER)
+
+	def loop(self):
+		self.connection.record_enable_context(self.context, self.handle_reply)
+		self.connection.record_free_context(self.context)
+		self.connection.close()
+
+	def close(self):
+		control = Display()
+		control.record_disable_context(self.context)
+		control.close()
+
+	def handle_reply(self, reply):
+		listener = self.listener
+		while listener.connection.pending_events():
+			listener.connection.next_event()
+		if reply.category != record.FromServer or reply.client_swapped:
+			return
+		data = reply.data
+		for offset in range(0, len(data), EVENT_SIZE):
+			if data[offset] & 0x7f != X.KeyPress:
+				continue
+			detail = data[offset + 1]
+			if listener.context is listener.root_context and detail not in self.codes:
+				continue
+			time, state = KEY_EVENT.unpack_from(data, offset + 4)
+			listener.handle_keypress(KeyEvent(detail, state, time))
+
 
 class KeyboardListener:
 
 	def __init__(self, callback=None, on_error=None):
 		self.keys = []
-		self.temporary_grab: List = []
+		self.temporary_grab: bool = False
 		self.on_error = on_error
 		self.callback = callback
 		self.stopped = False
+		self.chord_timeout = 0
+		self.count = 0
+		self.timer: threading.Timer = None
+		self.grab_trace: tracing.Trace = None
+		self.lock = threading.Lock()
 
 		self.thread = threading.Thread(target=self.x_client_loop, daemon=True, name='key listener thread')
+		self.source: KeySource = None
 		self.connection = Display()
 		self.connection.set_error_handler(self._local_display_error_handler)
 
@@ -113,33 +236,35 @@ class KeyboardListener:
 	def add(self, key):
 		self.keys.append(key)
 
-	def start(self):
+	def start(self, source: KeySource = None, chord_timeout: int = 0):
+		self.source = source if source else XlibSource()
+		self.chord_timeout = chord_timeout
 		for key in self.keys:
-			self._bind_to_root(key)
+			self._bind(key, self.root_context)
+		self.root_context.compile()
+		for key in self.keys:
+			self._grab_keys(key.code, key.mask)
+		self.connection.sync()
+		if self.stopped:
+			raise Exception('Unable to bind: {}'.format(', '.join(str(key.accelerator) for key in self.keys)))
+		self.source.open(self)
 		self.thread.start()
 
-	def _bind_to_root(self, key):
-		self._bind(key, self.root_context)
-
 	def _bind(self, key: Key, node: Context):
 
 		if key.id in node.children:
-			raise Exception('key ({}) already mapped'.format(', '.join(key.accelerator)))
+			raise Exception('key ({}) already mapped'.format(key.accelerator))
 
 		key_context = Context(key=key)
 		node.add(key_context)
 
-		if key_context.level == 1:
-			self._grab_keys(key.code, key.mask)
-			self.connection.sync()
-			if self.stopped:
-				raise Exception('Unable to bind: {}'.format(', '.join(key.accelerator)))
-
 		for combination in key.combinations:
 			self._bind(combination, key_context)
 
 	def stop(self):
 		self.stopped = True
+		if self.source:
+			self.source.close()
 		self.connection.close()
 
 	#
@@ -155,65 +280,96 @@ class KeyboardListener:
 	# Internal API
 	#
 	def _grab_keys(self, code, mask):
-		self.root.grab_key(code, mask,                           True, X.GrabModeAsync, X.GrabModeAsync)
-
-		self.root.grab_key(code, mask | X.Mod2Mask,              True, X.GrabModeAsync, X.GrabModeAsync)
-		self.root.grab_key(code, mask | X.Mod3Mask,              True, X.GrabModeAsync, X.GrabModeAsync)
-		self.root.grab_key(code, mask | X.LockMask,              True, X.GrabModeAsync, X.GrabModeAsync)
-
-		self.root.grab_key(code, mask | X.Mod2Mask | X.LockMask, True, X.GrabModeAsync, X.GrabModeAsync)
-		self.root.grab_key(code, mask | X.Mod2Mask | X.Mod3Mask, True, X.GrabModeAsync, X.GrabModeAsync)
-		self.root.grab_key(code, mask | X.Mod3Mask | X.LockMask, True, X.GrabModeAsync, X.GrabModeAsync)
-
-		self.root.grab_key(code, mask | X.Mod2Mask | X.Mod3Mask | X.LockMask, True, X.GrabModeAsync, X.GrabModeAsync)
+		"""
+		Queues the grab of every lock modifier variant, the caller syncs once after all keys are queued
+		"""
+		for variant in LOCK_VARIANTS:
+			self.root.grab_key(code, mask | variant, True, X.GrabModeAsync, X.GrabModeAsync)
 
 	#
 	# Event handling
 	#
 	def x_client_loop(self):
-		while not self.stopped:
-			event = self.connection.next_event()
-
-			if event.type == X.KeyPress:
-				self.handle_keypress(event)
+		self.source.loop()
 
 	# http://python-xlib.sourceforge.net/doc/html/python-xlib_13.html
 	# key_name = Gdk.keyval_name(event.keyval)
 	# print('key: {} wid: {} root_x: {} event_x: {}'.format(key_name, event.window.id, event.root_x, event.event_x))
 	def handle_keypress(self, e: Xlib.protocol.event.KeyPress):
-		mask = normalize_mask(e.state)
-		code = e.detail
-		key_id = (code, mask)
-
-		if key_id in self.context.children:
-			key: Key = self.context.children[key_id].key
-			if not key.ignore_modifier_mapping and e.detail in self.mod_keys_set:
+		with self.lock:
+			node = self.context.lookup(e.detail, e.state)
+
+			if node:
+				if not node.key.ignore_modifier_mapping and e.detail in self.mod_keys_set:
+					return
+				e.keyval = node.keyval
+				e.keymod = node.keymod
+				self.callback(node.key, e, max(self.count, 1))
+
+			if node and node.children:
+				self.advance_key_streak(node, e.time)
+			elif e.detail in self.mod_keys_set:
 				return
-			gdk_mask = Gdk.ModifierType(mask)
-			_wasmapped, keyval, egroup, level, consumed = keymap.translate_keyboard_state(e.detail, gdk_mask, 0)
-			e.keyval = keyval
-			e.keymod = gdk_mask
-			self.callback(key, e)
-
-		if key_id in self.context.children and self.context.children[key_id].children:
-			self.advance_key_streak(key_id, e.time)
-		elif e.detail not in self.mod_keys_set:
-			self.reset_key_streak(e.time)
-
-	def advance_key_streak(self, key_id: Tuple, time):
-		self.context = self.context.children[key_id]
+			elif not node and self.temporary_grab and self.count_digit(e):
+				self._arm_timer()
+			else:
+				self.reset_key_streak(e.time, 'dispatched' if node else 'aborted')
+
+	def count_digit(self, e) -> bool:
+		"""
+		Accumulates a digit typed inside a combination as the count the next command is repeated
+		"""
+		if normalize_mask(e.state):
+			return False
+		_wasmapped, keyval, egroup, level, consumed = keymap.translate_keyboard_state(e.detail, Gdk.ModifierType(0), 0)
+		if not Gdk.KEY_0 <= keyval <= Gdk.KEY_9:
+			return False
+		self.count = self.count * 10 + keyval - Gdk.KEY_0
+		return True
+
+	def advance_key_streak(self, node: Context, time):
+		self.context = node
 		if not self.temporary_grab:
 			self.root.grab_keyboard(True, X.GrabModeAsync, X.GrabModeAsync, time)
 			self.temporary_grab = True
+			self.grab_trace = tracing.Trace('grabbed')
 			keyboard_grab_event.fire()
+		self._arm_timer()
 
-	def reset_key_streak(self, time):
+	def reset_key_streak(self, time, outcome: str = 'aborted'):
 		self.context = self.root_context
+		self.count = 0
+		self._cancel_timer()
 		if self.temporary_grab:
 			self.connection.ungrab_keyboard(time)
 			self.temporary_grab = False
+			self.grab_trace.stamp(outcome)
+			tracing.record('<keyboard grab>', self.grab_trace)
 			keyboard_grab_event.fire()
 
+	#
+	# Chord timeout
+	#
+	def _arm_timer(self):
+		self._cancel_timer()
+		if self.chord_timeout:
+			self.timer = threading.Timer(self.chord_timeout / 1000, self._expire)
+			self.timer.daemon = True
+			self.timer.start()
+
+	def _cancel_timer(self):
+		if self.timer:
+			self.timer.cancel()
+			self.timer = None
+
+	def _expire(self):
+		with self.lock:
+			if self.timer is not threading.current_thread():
+				return
+			self.timer = None
+			self.reset_key_streak(X.CurrentTime, 'expired')
+			self.connection.flush()
+
 
 def normalize_mask(state) -> int:
 	normalized = 0
@@ -225,6 +381,24 @@ def normalize_mask(state) -> int:
 MODIFIERS = [
 	Gdk.ModifierType.CONTROL_MASK, Gdk.ModifierType.SHIFT_MASK,
 	Gdk.ModifierType.MOD1_MASK, Gdk.ModifierType.MOD4_MASK]
+# NumLock, ScrollLock and CapsLock states a bound key is also grabbed with
+LOCK_VARIANTS = [
+	0, X.Mod2Mask, X.Mod3Mask, X.LockMask,
+	X.Mod2Mask | X.LockMask, X.Mod2Mask | X.Mod3Mask, X.Mod3Mask | X.LockMask,
+	X.Mod2Mask | X.Mod3Mask | X.LockMask]
+
+# KeyPress wire layout: time at byte 4, state at byte 28
+EVENT_SIZE = 32
+KEY_EVENT = struct.Struct('=I20xH')
+RECORD_FILTER = [{
+	'core_requests': (0, 0), 'core_replies': (0, 0),
+	'ext_requests': (0, 0, 0, 0), 'ext_replies': (0, 0, 0, 0),
+	'delivered_events': (0, 0),
+	'device_events': (X.KeyPress, X.KeyPress),
+	'errors': (0, 0),
+	'client_started': False, 'client_died': False,
+}]
+SOURCES = {'xlib': XlibSource, 'record': RecordSource}
 
 keymap: Gdk.Keymap = Gdk.Keymap.get_default()
 keyboard_grab_event: KeyboardGrabEvent = KeyboardGrabEvent()
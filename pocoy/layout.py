@@ -15,15 +15,37 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from functools import lru_cache
 from gi.repository import Wnck
-from typing import List
+from typing import List, Dict, Tuple, Callable, NamedTuple
 from pocoy import state
-from pocoy.wm import set_geometry, resize, get_height, get_width
+from pocoy.wm import set_geometry, get_height, get_width, flush, await_configure, resize
 from pocoy.model import Monitor
 
 
+class Strip(NamedTuple):
+	"""
+	Area of the monitor shared by clients stacked along one axis, each one
+	taking an even share of the length left by the ones before it
+	"""
+	x: float
+	y: float
+	w: float
+	h: float
+	clients: Tuple[int, ...]
+	vertical: bool = True
+
+	def rectangle(self, index: int, consumed: float, gap: int) -> Tuple:
+		length = self.h if self.vertical else self.w
+		size = int((length - consumed) / (len(self.clients) - index)) - gap * 2
+		if self.vertical:
+			return self.x + gap, self.y + consumed + gap, self.w - gap * 2, size
+		return self.x + consumed + gap, self.y + gap, size, self.h - gap * 2
+
+
 #
-# LAYOUTS
+# SOLVERS
+# Pure functions from the client count, work area, nmaster and mfact to the strips of a layout
 #
 # https://git.suckless.org/dwm/file/dwm.c.html#l1674
 # MIT/X Consortium License
@@ -45,122 +67,73 @@ from pocoy.model import Monitor
 # © 2015-2016 Quentin Rameau <quinq@fifth.space>
 # © 2015-2016 Eric Pruitt <eric.pruitt@gmail.com>
 # © 2016-2017 Markus Teich <markus.teich@stusta.mhn.de>
-def tile(clients: List[Wnck.Window], m: Monitor):
-	n = len(clients)
+def tile_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	wx, wy, ww, wh = area
 
-	if n > m.nmaster:
-		mw = m.ww * m.mfact if m.nmaster else 0
+	if n > nmaster:
+		mw = ww * mfact if nmaster else 0
 	else:
-		mw = m.ww
-	my = ty = 0
-	padding = state.get_inner_gap()
-
-	for i in range(len(clients)):
-		window = clients[i]
-		if i < m.nmaster:
-			h = (m.wh - my) / (min(n, m.nmaster) - i) - padding * 2
-			synchronized = set_geometry(
-				window, synchronous=True, x=m.wx + padding, y=m.wy + my + ty + padding, w=mw - padding * 2, h=h, layoutaxis=m.ltaxis)
-			my += (get_height(window) if synchronized else h) + padding * 2
-		else:
-			h = (m.wh - ty) / (n - i) - padding * 2
-			synchronized = set_geometry(
-				window, synchronous=True, x=m.wx + mw + padding, y=m.wy + ty + padding, w=m.ww - mw - padding * 2, h=h, layoutaxis=m.ltaxis)
-			ty += (get_height(window) if synchronized else h) + padding * 2
+		mw = ww
+
+	return (
+		Strip(wx, wy, mw, wh, tuple(range(min(n, nmaster)))),
+		Strip(wx + mw, wy, ww - mw, wh, tuple(range(nmaster, n))))
 
 
 # https://git.suckless.org/dwm/file/dwm.c.html#l1104
-def monocle(clients, monitor):
-	padding = state.get_inner_gap()
-	for window in clients:
-		set_geometry(
-			window,
-			x=monitor.wx + padding, y=monitor.wy + padding,
-			w=monitor.ww - padding * 2, h=monitor.wh - padding * 2)
+def monocle_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	wx, wy, ww, wh = area
+	return tuple(Strip(wx, wy, ww, wh, (i,)) for i in range(n))
 
 
 # https://dwm.suckless.org/patches/centeredmaster/
-def centeredmaster(clients: List[Wnck.Window], m: Monitor):
-	tw = mw = m.ww
-	mx = my = 0
-	oty = ety = 0
-	n = len(clients)
-	padding = state.get_inner_gap()
-
-	if n > m.nmaster:
-		mw = int(m.ww * m.mfact) if m.nmaster else 0
-		tw = m.ww - mw
-
-		if n - m.nmaster > 1:
-			mx = int((m.ww - mw) / 2)
-			tw = int((m.ww - mw) / 2)
-
-	for i in range(len(clients)):
-		window = clients[i]
-		if i < m.nmaster:
-			# nmaster clients are stacked vertically, in the center of the screen
-			h = int((m.wh - my) / (min(n, m.nmaster) - i)) - padding * 2
-			synchronized = set_geometry(
-				window, synchronous=True, x=m.wx + mx + padding, y=m.wy + my + padding, w=mw - padding * 2, h=h)
-			my += (get_height(window) if synchronized else h) + padding * 2
-		else:
-			# stack clients are stacked vertically
-			if (i - m.nmaster) % 2:
-				h = int((m.wh - ety) / int((1 + n - i) / 2)) - padding * 2
-				synchronized = set_geometry(
-					window, synchronous=True, x=m.wx + padding, y=m.wy + ety + padding, w=tw - padding * 2, h=h)
-				ety += (get_height(window) if synchronized else h) + padding * 2
-			else:
-				h = int((m.wh - oty) / int((1 + n - i) / 2)) - padding * 2
-				synchronized = set_geometry(
-					window, synchronous=True, x=m.wx + mx + mw + padding, y=m.wy + oty + padding, w=tw - padding * 2, h=h)
-				oty += (get_height(window) if synchronized else h) + padding * 2
-
-
-def centeredfloatingmaster(clients: List[Wnck.Window], m: Monitor):
-	padding = state.get_inner_gap()
-	# i, n, w, mh, mw, mx, mxo, my, myo, tx = 0
-	tx = mx = 0
-
-	# count number of clients in the selected monitor
-	n = len(clients)
+def centeredmaster_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	wx, wy, ww, wh = area
+	tw = mw = ww
+	mx = 0
+
+	if n > nmaster:
+		mw = int(ww * mfact) if nmaster else 0
+		tw = ww - mw
+
+		if n - nmaster > 1:
+			mx = int((ww - mw) / 2)
+			tw = int((ww - mw) / 2)
+
+	stack = range(nmaster, n)
+	return (
+		# nmaster clients are stacked vertically, in the center of the screen
+		Strip(wx + mx, wy, mw, wh, tuple(range(min(n, nmaster)))),
+		# stack clients are stacked vertically, alternating between both sides
+		Strip(wx + mx + mw, wy, tw, wh, tuple(i for i in stack if not (i - nmaster) % 2)),
+		Strip(wx, wy, tw, wh, tuple(i for i in stack if (i - nmaster) % 2)))
+
+
+def centeredfloatingmaster_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	wx, wy, ww, wh = area
 
 	# initialize nmaster area
-	if n > m.nmaster:
+	if n > nmaster:
 		# go mfact box in the center if more than nmaster clients
-		if m.ww > m.wh:
-			mw = m.ww * m.mfact if m.nmaster else 0
-			mh = m.wh * 0.9 if m.nmaster else 0
+		if ww > wh:
+			mw = ww * mfact if nmaster else 0
+			mh = wh * 0.9 if nmaster else 0
 		else:
-			mh = m.wh * m.mfact if m.nmaster else 0
-			mw = m.ww * 0.9 if m.nmaster else 0
-		mx = mxo = (m.ww - mw) / 2
-		my = myo = (m.wh - mh) / 2
+			mh = wh * mfact if nmaster else 0
+			mw = ww * 0.9 if nmaster else 0
+		mx = (ww - mw) / 2
+		my = (wh - mh) / 2
 	else:
 		# go fullscreen if all clients are in the master area
-		mh = m.wh
-		mw = m.ww
-		mx = mxo = 0
-		my = myo = 0
-
-	for i in range(len(clients)):
-		c = clients[i]
-		if i < m.nmaster:
-			# nmaster clients are stacked horizontally, in the center of the screen
-			w = (mw + mxo - mx) / (min(n, m.nmaster) - i)
-			synchronized = set_geometry(
-				c, synchronous=True,
-				x=m.wx + mx + padding, y=m.wy + my + padding,
-				w=w, h=mh - padding * 2)
-			mx += get_width(c)
-		else:
-			# stack clients are stacked horizontally
-			w = (m.ww - tx) / (n - i) - (padding * 2)
-			synchronized = set_geometry(
-				c, synchronous=True,
-				x=m.wx + tx + padding, y=m.wy + padding,
-				w=w, h=m.wh - padding * 2)
-			tx += get_width(c) + padding * 2
+		mh = wh
+		mw = ww
+		mx = my = 0
+
+	return (
+		# nmaster clients are stacked horizontally, in the center of the screen
+		Strip(wx + mx, wy + my, mw, mh, tuple(range(min(n, nmaster))), vertical=False),
+		# stack clients are stacked horizontally
+		Strip(wx, wy, ww, wh, tuple(range(nmaster, n)), vertical=False))
 
 
 # https://dwm.suckless.org/patches/fibonacci/
@@ -168,18 +141,16 @@ def centeredfloatingmaster(clients: List[Wnck.Window], m: Monitor):
 # Niki Yoshiuchi - aplusbi@gmail.com
 # Joe Thornber
 # Jan Christoph Ebersbach
-def fibonacci(mon: Monitor, clients: List[int], s: int):
-	n = len(clients)
-	nx = mon.wx
+def fibonacci_strips(n: int, area: Tuple, mfact: float, s: int) -> Tuple[Strip, ...]:
+	wx, wy, ww, wh = area
+	nx = wx
 	ny = 0
-	nw = mon.ww
-	nh = mon.wh
-	padding = state.get_inner_gap()
+	nw = ww
+	nh = wh
+	strips = []
 
 	for i in range(n):
-		c = clients[i]
-		c.bw = 0
-		if (i % 2 and nh / 2 > 2 * c.bw) or (not (i % 2) and nw / 2 > 2 * c.bw):
+		if (i % 2 and nh / 2 > 0) or (not (i % 2) and nw / 2 > 0):
 			if i < n - 1:
 				if i % 2:
 					nh /= 2
@@ -205,60 +176,240 @@ def fibonacci(mon: Monitor, clients: List[int], s: int):
 					nx -= nw
 			if i == 0:
 				if n != 1:
-					nw = mon.ww * mon.mfact
-				ny = mon.wy
+					nw = ww * mfact
+				ny = wy
 			elif i == 1:
-				nw = mon.ww - nw
-		set_geometry(
-			c,
-			x=nx + padding, y=ny + padding,
-			w=nw - padding * 2, h=nh - padding * 2)
+				nw = ww - nw
+		strips.append(Strip(nx, ny, nw, nh, (i,)))
+
+	return tuple(strips)
+
+
+def dwindle_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	return fibonacci_strips(n, area, mfact, 1)
+
+
+def spiral_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	return fibonacci_strips(n, area, mfact, 0)
+
+
+def arrow_strips(n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	wx, wy, ww, wh = area
+	mw = int(ww * mfact) if nmaster else 0
+	mx = tw = int((ww - mw) / 2)
+	stack = range(nmaster, n)
+
+	return (
+		# nmaster clients are stacked vertically, in the center of the screen
+		Strip(wx + mx, wy, mw, wh, tuple(range(min(n, nmaster)))),
+		# the first stack client takes the left side
+		Strip(wx, wy, tw, wh, tuple(stack[:1])),
+		# the other ones are stacked vertically on the right
+		Strip(wx + mx + mw, wy, tw, wh, tuple(stack[1:])))
+
+
+@lru_cache(maxsize=512)
+def solve(solver: Callable, n: int, area: Tuple, nmaster: int, mfact: float) -> Tuple[Strip, ...]:
+	return solver(n, area, nmaster, mfact)
+
+
+@lru_cache(maxsize=512)
+def strip_rectangles(strip: Strip, gap: int) -> Tuple[Tuple, ...]:
+	"""
+	The rectangle of each client of the strip, in the strip order, if every client takes the size it is given
+	"""
+	result = []
+	consumed = 0
+	for index in range(len(strip.clients)):
+		rectangle = strip.rectangle(index, consumed, gap)
+		result.append(rectangle)
+		consumed += (rectangle[3] if strip.vertical else rectangle[2]) + gap * 2
+	return tuple(result)
+
+
+def rectangles(solver: Callable, n: int, area: Tuple, nmaster: int, mfact: float, gap: int) -> Tuple[Tuple, ...]:
+	"""
+	The rectangle of each client, in the stack order
+	"""
+	result = [None] * n
+	for strip in solve(solver, n, area, nmaster, mfact):
+		for client, rectangle in zip(strip.clients, strip_rectangles(strip, gap)):
+			result[client] = rectangle
+	return tuple(result)
+
+
+#
+# LAYOUTS
+#
+def tile(clients: List[Wnck.Window], monitor: Monitor):
+	arrange(monitor, clients, tile_strips)
+
+
+def monocle(clients: List[Wnck.Window], monitor: Monitor):
+	arrange(monitor, clients, monocle_strips)
+
+
+def centeredmaster(clients: List[Wnck.Window], monitor: Monitor):
+	arrange(monitor, clients, centeredmaster_strips)
+
+
+def centeredfloatingmaster(clients: List[Wnck.Window], monitor: Monitor):
+	arrange(monitor, clients, centeredfloatingmaster_strips)
 
 
 def dwindle(clients: List[Wnck.Window], monitor: Monitor):
-	fibonacci(monitor, clients, 1)
+	arrange(monitor, clients, dwindle_strips)
 
 
 def spiral(clients: List[Wnck.Window], monitor: Monitor):
-	fibonacci(monitor, clients, 0)
+	arrange(monitor, clients, spiral_strips)
 
 
 def arrow(clients: List[Wnck.Window], monitor: Monitor):
-	n = len(clients)
-	if n == 1:
+	if len(clients) == 1:
+		# a lone client floats in the middle of the monitor work area, gaps aside
 		resize(clients[0], l=0.15, t=0.1, w=0.7, h=0.86)
 		return
-	oty = 0
-	mw = int(monitor.ww * monitor.mfact) if monitor.nmaster else 0
-	mx = tw = int((monitor.ww - mw) / 2)
-	my = 0
-	padding = state.get_inner_gap()
+	arrange(monitor, clients, arrow_strips)
 
-	for i in range(n):
-		window: Wnck.Window = clients[i]
-		if i < monitor.nmaster:
-			# nmaster clients are stacked vertically, in the center of the screen
-			h = int((monitor.wh - my) / (min(n, monitor.nmaster) - i))
-			set_geometry(
-				window,
-				x=monitor.wx + mx + padding, y=monitor.wy + my + padding,
-				w=mw - padding * 2, h=h - padding * 2)
-			my += h
-		else:
-			# stack clients are stacked vertically
-			if (i - monitor.nmaster) == 0:
-				set_geometry(
-					window,
-					x=monitor.wx + padding, y=monitor.wy + padding,
-					w=tw - padding * 2, h=monitor.wh - padding * 2)
-			else:
-				h = int((monitor.wh - oty) / (n - i))
-				synchronized = set_geometry(
-					window, synchronous=True,
-					x=monitor.wx + mx + mw + padding, y=monitor.wy + oty + padding,
-					w=tw - padding * 2, h=h - padding * 2)
-
-				oty += ((get_height(window) + padding * 2) if synchronized else h)
+
+#
+# ENGINE
+#
+class Placement(NamedTuple):
+	rectangle: Tuple
+	size: float
+	observed: Tuple = None
+
+
+class Column:
+	"""
+	Windows of a strip, placed after the actual size of the ones before them
+	"""
+
+	def __init__(self, strip: Strip, windows: List[Wnck.Window], monitor: Monitor):
+		self.strip = strip
+		self.vertical = strip.vertical
+		self.windows = windows
+		self.monitor = monitor
+		self.consumed: List[float] = [0] * len(windows)
+		self.requested: List[float] = [0] * len(windows)
+		# while every window took the size it was given, the rectangles are the solved ones
+		self.nominal = True
+
+	def measure(self, window: Wnck.Window):
+		return get_height(window) if self.vertical else get_width(window)
+
+	def index_of(self, xid: int):
+		return next((i for i in range(len(self.windows)) if self.windows[i].get_xid() == xid), None)
+
+	def place(self, start: int = 0, synchronous: bool = False):
+		"""
+		Places the windows from start on, after the length consumed by the previous ones.
+		If synchronous, stops after the first configure request and resumes once it is acknowledged
+		"""
+		padding = state.get_inner_gap()
+		solved = strip_rectangles(self.strip, padding)
+		consumed = self.consumed[start] if start < len(self.windows) else 0
+		for i in range(start, len(self.windows)):
+			window = self.windows[i]
+			rectangle = solved[i] if self.nominal else self.strip.rectangle(i, consumed, padding)
+			key = rectangle + (self.monitor.ltaxis is not None,)
+			self.consumed[i] = consumed
+			self.requested[i] = rectangle[3] if self.vertical else rectangle[2]
+
+			if is_settled(window, key):
+				size = placed[window.get_xid()].size
+				self.nominal = self.nominal and size == self.requested[i]
+				consumed += size + padding * 2
+				continue
+
+			x, y, w, h = rectangle
+			sent = set_geometry(window, x=x, y=y, w=w, h=h, layoutaxis=self.monitor.ltaxis)
+			if sent:
+				# a suppressed request gets no CONFIGURE back, so only a sent one is reconciled
+				placed[window.get_xid()] = Placement(key, self.requested[i])
+				if synchronous:
+					flush()
+					awaiting[window.get_xid()] = self
+					await_configure(window.get_xid(), lambda acknowledged, index=i: self.resume(index, acknowledged))
+					return
+				reconciling[window.get_xid()] = self
+			consumed += self.requested[i] + padding * 2
+
+	def resume(self, index: int, acknowledged: bool):
+		"""
+		Continues a synchronous placement after the window at index was configured or its deadline passed
+		"""
+		window = self.windows[index]
+		if awaiting.get(window.get_xid()) is not self:
+			return
+		del awaiting[window.get_xid()]
+		size = self.measure(window) if acknowledged else self.requested[index]
+		self.nominal = self.nominal and size == self.requested[index]
+		if window.get_xid() in placed:
+			placed[window.get_xid()] = placed[window.get_xid()]._replace(
+				size=size, observed=tuple(window.get_geometry()) if acknowledged else None)
+		if index + 1 < len(self.windows):
+			self.consumed[index + 1] = self.consumed[index] + size + state.get_inner_gap() * 2
+			self.place(start=index + 1, synchronous=True)
+
+
+def arrange(monitor: Monitor, clients: List[Wnck.Window], solver: Callable):
+	"""
+	Sends the geometry of every window, each column waiting its windows to be
+	configured one after the other if the layout is synchronous, otherwise in
+	one batch that is reconciled as the CONFIGURE events arrive
+	"""
+	for pending in (reconciling, awaiting):
+		for xid in list(pending.keys()):
+			if pending[xid].monitor is monitor:
+				del pending[xid]
+
+	synchronous = state.is_synchronous_layout()
+	area = (monitor.wx, monitor.wy, monitor.ww, monitor.wh)
+	for strip in solve(solver, len(clients), area, monitor.nmaster, monitor.mfact):
+		column = Column(strip, [clients[i] for i in strip.clients], monitor)
+		column.place(synchronous=synchronous)
+
+	if not synchronous:
+		flush()
+
+
+def is_settled(window: Wnck.Window, key: Tuple):
+	"""
+	If the window was already configured to the rectangle and did not move since
+	"""
+	placement: Placement = placed.get(window.get_xid())
+	return (
+			placement and placement.rectangle == key and placement.observed
+			and placement.observed == tuple(window.get_geometry()))
+
+
+def reconcile(xid: int):
+	"""
+	Re-places the windows after the one configured if it refused the requested size
+	"""
+	column: Column = reconciling.pop(xid, None)
+	if not column:
+		return
+	index = column.index_of(xid)
+	if index is None:
+		return
+	window = column.windows[index]
+	actual = int(column.measure(window))
+	if xid in placed:
+		placed[xid] = placed[xid]._replace(size=actual, observed=tuple(window.get_geometry()))
+	if index + 1 < len(column.windows) and actual != int(column.requested[index]):
+		column.nominal = False
+		column.consumed[index + 1] = column.consumed[index] + actual + state.get_inner_gap() * 2
+		column.place(start=index + 1)
+
+
+def forget(xid: int):
+	placed.pop(xid, None)
+	reconciling.pop(xid, None)
+	awaiting.pop(xid, None)
 
 
 FUNCTIONS_MAP = {
@@ -267,3 +418,6 @@ FUNCTIONS_MAP = {
 	'C': centeredmaster, '>': centeredfloatingmaster, '<': arrow,
 	'@': spiral, '\\': dwindle
 }
+reconciling: Dict[int, Column] = {}
+awaiting: Dict[int, Column] = {}
+placed: Dict[int, Placement] = {}
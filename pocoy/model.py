@@ -15,45 +15,110 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import traceback, re
+from functools import wraps
+from bisect import bisect_left, bisect_right, insort
 import pocoy.messages as messages
 from gi.repository import Wnck, Gdk
 from typing import List, Dict, Tuple, Callable
 from pocoy.names import PROMPT
-from pocoy.wm import gdk_window_for, resize, is_visible, \
+from pocoy.wm import gdk_window_for, resize, is_visible, snapshot_of, forget_snapshot, SnapshotScope, \
 	get_last_focused, decoration_delta, UserEvent, monitor_of, X_Y_W_H_GEOMETRY_MASK, \
-	is_managed, is_buffer, \
+	is_managed, is_buffer, intersect, \
 	get_active_workspace, get_workspace_outside_primary
 from pocoy.decoration import DECORATION_MAP
-from pocoy import decoration, state, wm
+from pocoy import decoration, state, wm, tracing
 
 
 def impure(mutates: bool = False):
 	def decorator(function):
+		@wraps(function)
 		def read_write_state(self, user_event: UserEvent):
-			windows.read(Wnck.Screen.get_default())
-			try:
-				return function(self, user_event)
-			finally:
-				if mutates:
-					persist()
+			with SnapshotScope():
+				windows.sync(Wnck.Screen.get_default())
+				try:
+					return function(self, user_event)
+				finally:
+					if mutates:
+						persist()
 		return read_write_state
 	return decorator
 
 
 def in_visible_monitor(w: Wnck.Window):
+	snapshot = snapshot_of(w)
 	return (
-			is_buffer(w)
-			and not w.is_minimized()
-			and monitors.id_for(w.get_workspace(), wm.monitor_of(w.get_xid())) in monitors.visible_ids
+			snapshot.buffer
+			and not snapshot.minimized
+			and monitors.id_for(snapshot.workspace, wm.monitor_of(w.get_xid())) in monitors.visible_ids
 	)
 
 
+class SpatialIndex:
+	"""
+	Top left corners of the buffers, sorted along each axis to find the nearest one in a direction
+	"""
+
+	def __init__(self):
+		self.corners: Dict[int, Tuple[int, int]] = {}
+		self.lines: Tuple[List, List] = ([], [])
+
+	def clear(self):
+		self.corners.clear()
+		for line in self.lines:
+			del line[:]
+
+	def put(self, xid: int, corner: Tuple[int, int]):
+		if self.corners.get(xid) == corner:
+			return
+		self.remove(xid)
+		self.corners[xid] = corner
+		for i in range(2):
+			insort(self.lines[i], (corner[i], xid))
+
+	def remove(self, xid: int):
+		corner = self.corners.pop(xid, None)
+		if corner is None:
+			return
+		for i in range(2):
+			line = self.lines[i]
+			del line[bisect_left(line, (corner[i], xid))]
+
+	def nearest(self, xid: int, increment: int, axis_index: int, accept: Callable[[int], bool]) -> int:
+		"""
+		The accepted window ahead of xid in the direction of the increment along the axis, closest by
+		the distance along the axis plus the perpendicular one. The scan stops once the distance along
+		the axis alone is greater than the best found.
+		"""
+		if xid not in self.corners:
+			return None
+		origin = self.corners[xid]
+		line = self.lines[axis_index]
+		if increment > 0:
+			candidates = range(bisect_right(line, (origin[axis_index], float('inf'))), len(line))
+		else:
+			candidates = range(bisect_left(line, (origin[axis_index], float('-inf'))) - 1, -1, -1)
+		best = best_distance = None
+		for i in candidates:
+			position, candidate = line[i]
+			distance = abs(position - origin[axis_index])
+			if best is not None and distance >= best_distance:
+				break
+			distance += abs(self.corners[candidate][1 - axis_index] - origin[1 - axis_index])
+			if (best is None or distance < best_distance) and accept(candidate):
+				best, best_distance = candidate, distance
+		return best
+
+
 class Windows:
 
 	def __init__(self):
 		self.window_by_xid: Dict[int, Wnck.Window] = {}
 		self.buffers: List[int] = []
+		self.spatial_index = SpatialIndex()
+		self.line: List[Wnck.Window] = None
+		self.line_positions: Dict[int, int] = {}
 		self.staging = False
+		self.dirty = True
 
 	def read_default_screen(self, force_update=True):
 		self.read(Wnck.Screen.get_default(), force_update=force_update)
@@ -62,42 +127,122 @@ class Windows:
 		if force_update:
 			screen.force_update()  # make sure we query X server
 
+		with SnapshotScope():
+			self._read(screen)
+
+	def _read(self, screen: Wnck.Screen):
 		monitors.read(screen)
 
+		self.window_by_xid.clear()
+		del self.buffers[:]
+		self.spatial_index.clear()
+		self.line = None
 		for wnck_window in screen.get_windows():
 			xid = wnck_window.get_xid()
 			self.window_by_xid[xid] = wnck_window
 			if is_buffer(wnck_window):
 				self.buffers.append(xid)
+				self.spatial_index.put(xid, snapshot_of(wnck_window).geometry[:2])
 
 		active_window.read_screen()
 		self._read_workspaces(screen)
+		self.dirty = False
+		tracing.stamp('read')
 
-	def _read_workspaces(self, screen: Wnck.Screen):
-		for workspace in screen.get_workspaces():
-			for i in range(Gdk.Display.get_default().get_n_monitors()):
-				gdk_monitor = Gdk.Display.get_default().get_monitor(i)
-				self._read_workspace_monitor(screen, workspace, gdk_monitor)
-
-	def _read_workspace_monitor(self, screen: Wnck.Screen, workspace: Wnck.Workspace, gdk_monitor: Gdk.Monitor):
-		monitor: Monitor = monitors.of(workspace, gdk_monitor)
-		clients: List[int] = monitor.clients
+	def sync(self, screen: Wnck.Screen):
+		"""
+		Reads the whole screen only if the model was invalidated, otherwise
+		trusts the index kept up to date by the window signals. A navigation staged
+		by a repeated command is kept, X reports the active window only once it is committed
+		"""
+		if self.dirty:
+			self.read(screen)
+		elif not self.staging:
+			active_window.read_screen()
 
-		def monitor_filter(w):
-			return w.get_xid() not in clients and is_visible(w, workspace, gdk_monitor) and is_managed(w)
+	def invalidate(self):
+		self.dirty = True
+		self.line = None
 
-		for old in filter(lambda xid: xid not in self.window_by_xid, clients.copy()):
-			clients.remove(old)
+	def _read_workspaces(self, screen: Wnck.Screen):
+		"""
+		Buckets the managed windows by monitor in a single pass over the stack. Visible monitors
+		reconcile their clients right away, the others when their clients are first used
+		"""
+		display = Gdk.Display.get_default()
+		gdk_monitors = [display.get_monitor(i) for i in range(display.get_n_monitors())]
+		workspaces = screen.get_workspaces()
+		buckets: Dict[Tuple, List[int]] = {}
+		for workspace in workspaces:
+			for gdk_monitor in gdk_monitors:
+				buckets[monitors.id_for(workspace, gdk_monitor)] = []
+
+		for window in reversed(screen.get_windows_stacked()):
+			if snapshot_of(window).minimized or not is_managed(window):
+				continue
+			workspace = snapshot_of(window).workspace
+			for candidate in [workspace] if workspace else workspaces:
+				if not window.is_in_viewport(candidate) or not window.is_visible_on_workspace(candidate):
+					continue
+				for gdk_monitor in gdk_monitors:
+					if intersect(window, gdk_monitor):
+						buckets[monitors.id_for(candidate, gdk_monitor)].append(window.get_xid())
+
+		monitors.pending.update(buckets)
+		for monitor_id in monitors.visible_ids:
+			monitors.reconcile(monitor_id)
 
-		for outside in filter(lambda xid: not is_visible(self.window_by_xid[xid], workspace, gdk_monitor), clients.copy()):
-			clients.remove(outside)
+	#
+	# Incremental API
+	#
+	def add(self, window: Wnck.Window):
+		self.window_by_xid[window.get_xid()] = window
+		self.update(window)
 
-		clients.extend(map(lambda w: w.get_xid(), filter(monitor_filter, reversed(screen.get_windows_stacked()))))
+	def update(self, window: Wnck.Window):
+		xid = window.get_xid()
+		if xid not in self.window_by_xid:
+			return
+		self.line = None
+		with SnapshotScope():
+			if is_buffer(window) and xid not in self.buffers:
+				self.buffers.append(xid)
+			elif not is_buffer(window) and xid in self.buffers:
+				self.buffers.remove(xid)
+			if is_buffer(window):
+				self.spatial_index.put(xid, snapshot_of(window).geometry[:2])
+			else:
+				self.spatial_index.remove(xid)
+			self._read_window(window)
+
+	def remove(self, xid: int):
+		self.window_by_xid.pop(xid, None)
+		self.spatial_index.remove(xid)
+		self.line = None
+		if xid in self.buffers:
+			self.buffers.remove(xid)
+		for monitor in monitors.holding(xid):
+			monitor.clients.remove(xid)
+
+	def _read_window(self, window: Wnck.Window):
+		xid = window.get_xid()
+		managed = is_managed(window)
+		display = Gdk.Display.get_default()
+		for workspace in window.get_screen().get_workspaces():
+			for i in range(display.get_n_monitors()):
+				gdk_monitor = display.get_monitor(i)
+				monitor = monitors.map.get(monitors.id_for(workspace, gdk_monitor))
+				if not monitor:
+					self.invalidate()
+					continue
+				inside = managed and is_visible(window, workspace, gdk_monitor)
+				if inside and xid not in monitor.clients:
+					monitor.clients.append(xid)
+				elif not inside and xid in monitor.clients:
+					monitor.clients.remove(xid)
 
 	def clean(self):
-		del self.buffers[:]
 		active_window.clean()
-		self.window_by_xid.clear()
 
 	#
 	# API
@@ -110,12 +255,23 @@ class Windows:
 		if self.staging and active_window.xid and active_window.get_wnck_window():
 			active_window.get_wnck_window().activate_transient(event_time)
 		self.staging = False
+		tracing.stamp('navigation')
 
 	def get_window_line(self) -> List[Wnck.Window]:
+		"""
+		The visible buffers from left to right, kept until a window changes or the model is invalidated
+		"""
 		def sort_line(w):
-			geometry = w.get_geometry()
-			return geometry.xp * STRETCH + geometry.yp
-		return sorted(filter(in_visible_monitor, Wnck.Screen.get_default().get_windows()), key=sort_line)
+			xp, yp, widthp, heightp = snapshot_of(w).geometry
+			return xp * STRETCH + yp
+		if self.line is None:
+			self.line = sorted(filter(in_visible_monitor, Wnck.Screen.get_default().get_windows()), key=sort_line)
+			self.line_positions = {window.get_xid(): i for i, window in enumerate(self.line)}
+		return self.line
+
+	def get_line_neighbour(self, window: Wnck.Window, offset: int) -> Wnck.Window:
+		line = self.get_window_line()
+		return line[(self.line_positions[window.get_xid()] + offset) % len(line)]
 
 	def get_buffers(self):
 		return list(map(lambda xid: self.window_by_xid[xid], self.buffers))
@@ -138,6 +294,9 @@ class Windows:
 		return get_last_focused(window_filter=in_visible_monitor)
 
 	def get_last_managed_focused(self):
+		staged = active_window.get_wnck_window() if self.staging else None
+		if staged:
+			return staged if is_managed(staged) else None
 		active = Wnck.Screen.get_default().get_active_window()
 		if not active:
 			return None
@@ -284,6 +443,7 @@ class Windows:
 				x + gdk_monitor.get_workarea().x, y + gdk_monitor.get_workarea().y,
 				parameters[4] if len(parameters) > 4 else window.get_geometry().widthp,
 				parameters[5] if len(parameters) > 5 else window.get_geometry().heightp)
+		forget_snapshot(window)
 
 
 class ActiveWindow:
@@ -321,11 +481,13 @@ class ActiveWindow:
 		for xid in monitor.clients:
 			if self.xid != xid:
 				windows.window_by_xid[xid].minimize()
+				forget_snapshot(windows.window_by_xid[xid])
 
 	@impure(mutates=False)
 	def minimize(self, user_event: UserEvent):
 		if self.xid:
 			self.get_wnck_window().minimize()
+			forget_snapshot(self.get_wnck_window())
 
 	@impure(mutates=False)
 	def maximize(self, user_event: UserEvent):
@@ -368,6 +530,8 @@ class ActiveWindow:
 			opt = DECORATION_MAP[decoration_parameter]
 		gdk_window = gdk_window_for(self.get_wnck_window())
 		gdk_window.set_decorations(opt)
+		wm.invalidate_decoration(self.xid)
+		decoration.invalidate(self.xid)
 
 	@impure(mutates=True)
 	def zoom(self, user_event: UserEvent):
@@ -378,11 +542,10 @@ class ActiveWindow:
 		clients = monitor.clients
 		if len(clients) < 2:
 			return
-		old_index = clients.index(active.get_xid())
-		if old_index == 0:
-			clients.insert(1, clients.pop(old_index))
+		if clients.index(active.get_xid()) == 0:
+			clients.move_to(active.get_xid(), 1)
 		else:
-			clients.insert(0, clients.pop(old_index))
+			clients.promote(active.get_xid())
 		active_window.change_to(clients[0])
 		monitor.apply()
 
@@ -393,12 +556,7 @@ class ActiveWindow:
 		if not window:
 			return
 		monitor = monitors.get_active(window)
-		clients = monitor.clients
-		old_index = clients.index(window.get_xid())
-		new_index = (old_index + direction) % len(clients)
-
-		if new_index != old_index:
-			clients.insert(new_index, clients.pop(old_index))
+		if monitor.clients.move(window.get_xid(), direction):
 			monitor.apply()
 
 	@impure(mutates=True)
@@ -415,6 +573,7 @@ class ActiveWindow:
 
 		if destination.get_workspace().get_number() != origin.get_workspace().get_number():
 			window.move_to_workspace(destination.get_workspace())
+			forget_snapshot(window)
 
 		origin.clients.remove(window.get_xid())
 		destination.clients.append(window.get_xid())
@@ -429,12 +588,7 @@ class ActiveWindow:
 		if not window:
 			return
 		monitor = monitors.get_active(window)
-		clients = monitor.clients
-
-		old_index = clients.index(window.get_xid())
-		new_index = (old_index + direction) % len(clients)
-
-		active_window.change_to(clients[new_index])
+		active_window.change_to(monitor.clients.neighbour(window.get_xid(), direction))
 
 	@impure(mutates=True)
 	def killclient(self, user_event: UserEvent):
@@ -463,30 +617,18 @@ class ActiveWindow:
 
 	def move_focus(self, increment, axis):
 		active = self.get_wnck_window()
-
-		def key(w):
-			axis_position = axis.position_of(w)
-			perpendicular_distance = abs(axis.perpendicular.position_of(w) - axis.perpendicular.position_of(active))
-			perpendicular_distance *= -1 if axis_position < axis.position_of(active) else 1
-			return axis_position + perpendicular_distance
-
-		sorted_windows = sorted(filter(in_visible_monitor, Wnck.Screen.get_default().get_windows()), key=key)
-
-		index = sorted_windows.index(active)
-		if 0 <= index + increment < len(sorted_windows):
-			index = index + increment
-			next_index = index + increment
-			while 0 <= next_index < len(sorted_windows) and axis.position_of(sorted_windows[index]) == axis.position_of(active):
-				index = next_index
-				next_index += increment
-		self.change_to(sorted_windows[index].get_xid())
+		if not active:
+			return
+		nearest = windows.spatial_index.nearest(
+			active.get_xid(), increment, 0 if axis is HORIZONTAL else 1,
+			lambda xid: in_visible_monitor(windows.window_by_xid[xid]))
+		if nearest:
+			self.change_to(nearest)
 
 	@impure(mutates=False)
 	def focus_next(self, user_event: UserEvent):
 		direction = 1 if not user_event or Gdk.keyval_name(user_event.keyval).islower() else -1
-		line = windows.get_window_line()
-		i = line.index(self.get_wnck_window())
-		next_window = line[(i + direction) % len(line)]
+		next_window = windows.get_line_neighbour(self.get_wnck_window(), direction)
 		self.change_to(next_window.get_xid())
 
 	@impure(mutates=False)
@@ -511,6 +653,146 @@ class ActiveWindow:
 		next_workspace.activate(user_event.time)
 
 
+class Clients(list):
+	"""
+	The xids of a monitor in stack order, indexing the position of each one and
+	keeping the reverse client to monitor index of Monitors in sync
+	"""
+
+	def __init__(self, monitor: 'Monitor', xids=()):
+		super().__init__(xids)
+		self.monitor = monitor
+		self.positions: Dict[int, int] = None
+		for xid in self:
+			self._register(xid)
+
+	def _register(self, xid: int):
+		owners = monitors.by_client.setdefault(xid, [])
+		if self.monitor not in owners:
+			owners.append(self.monitor)
+
+	def _unregister(self, xid: int):
+		owners = monitors.by_client.get(xid)
+		if owners and self.monitor in owners:
+			owners.remove(self.monitor)
+			if not owners:
+				del monitors.by_client[xid]
+
+	def _changed(self, added=(), removed=()):
+		self.positions = None
+		for xid in removed:
+			if not super().__contains__(xid):
+				self._unregister(xid)
+		for xid in added:
+			self._register(xid)
+
+	def detach(self):
+		"""
+		Drops the clients from the reverse index, once the monitor holds another list
+		"""
+		for xid in self:
+			self._unregister(xid)
+
+	def move_to(self, xid: int, index: int):
+		"""
+		Moves the client to the index, shifting only the clients in between, so
+		moving to an adjacent position is a swap
+		"""
+		old_index = self.index(xid)
+		if old_index == index:
+			return
+		step = 1 if index > old_index else -1
+		positions = self._index()
+		for i in range(old_index, index, step):
+			shifted = list.__getitem__(self, i + step)
+			list.__setitem__(self, i, shifted)
+			positions[shifted] = i
+		list.__setitem__(self, index, xid)
+		positions[xid] = index
+
+	def promote(self, xid: int):
+		self.move_to(xid, 0)
+
+	def move(self, xid: int, offset: int) -> bool:
+		"""
+		Moves the client by the offset, wrapping around the stack, and returns if it moved
+		"""
+		old_index = self.index(xid)
+		new_index = (old_index + offset) % len(self)
+		self.move_to(xid, new_index)
+		return new_index != old_index
+
+	def neighbour(self, xid: int, offset: int) -> int:
+		return list.__getitem__(self, (self.index(xid) + offset) % len(self))
+
+	def _index(self) -> Dict[int, int]:
+		if self.positions is None:
+			self.positions = {xid: i for i, xid in enumerate(self)}
+		return self.positions
+
+	def __contains__(self, xid):
+		return xid in self._index()
+
+	def index(self, xid, *args):
+		if args:
+			return super().index(xid, *args)
+		positions = self._index()
+		if xid not in positions:
+			raise ValueError('{} is not in clients'.format(xid))
+		return positions[xid]
+
+	def append(self, xid):
+		super().append(xid)
+		if self.positions is not None:
+			self.positions[xid] = len(self) - 1
+		self._register(xid)
+
+	def extend(self, xids):
+		xids = list(xids)
+		super().extend(xids)
+		self._changed(added=xids)
+
+	def __iadd__(self, xids):
+		self.extend(xids)
+		return self
+
+	def insert(self, i, xid):
+		super().insert(i, xid)
+		self._changed(added=(xid,))
+
+	def remove(self, xid):
+		super().remove(xid)
+		self._changed(removed=(xid,))
+
+	def pop(self, i=-1):
+		xid = super().pop(i)
+		self._changed(removed=(xid,))
+		return xid
+
+	def clear(self):
+		removed = list(self)
+		super().clear()
+		self._changed(removed=removed)
+
+	def sort(self, *args, **kwargs):
+		super().sort(*args, **kwargs)
+		self._changed()
+
+	def reverse(self):
+		super().reverse()
+		self._changed()
+
+	def __setitem__(self, i, value):
+		removed = self[i] if isinstance(i, slice) else (self[i],)
+		super().__setitem__(i, value)
+		self._changed(added=value if isinstance(i, slice) else (value,), removed=removed)
+
+	def __delitem__(self, i):
+		removed = self[i] if isinstance(i, slice) else (self[i],)
+		super().__delitem__(i)
+		self._changed(removed=removed)
+
+
 # https://valadoc.org/gdk-3.0/Gdk.Monitor.html
 class Monitor:
 
@@ -531,10 +813,23 @@ class Monitor:
 		self.wx = self.wy = self.ww = self.wh = None
 		self.visible_area: List[int] = [0, 0, 0, 0]
 		self.center = [0, 0]
-		self.clients: List[int] = []
+		self._clients: Clients = Clients(self)
 		self.pointer: Monitor = None
 		self.model = model
 		self.workspace = workspace
+		self.snapshot_key: Tuple = None
+		self.json: Dict = None
+
+	@property
+	def clients(self) -> Clients:
+		if self.id in monitors.pending:
+			monitors.reconcile(self.id)
+		return self._clients
+
+	@clients.setter
+	def clients(self, xids: List[int]):
+		self._clients.detach()
+		self._clients = Clients(self, xids)
 
 	def mirror_x_axis(self, x, y, w, h):
 		return self.center[0] * 2 - x - w, y
@@ -553,6 +848,7 @@ class Monitor:
 				for window in spread_windows:
 					wm.unmaximize(window)
 			FUNCTIONS_MAP[self.function_key](spread_windows, self)
+			tracing.stamp('layout')
 
 	def set_rectangle(self, rectangle: Gdk.Rectangle):
 		self.visible_area = [
@@ -585,7 +881,7 @@ class Monitor:
 
 	def contains(self, window: Wnck.Window):
 		rect = self.visible_area
-		xp, yp, widthp, heightp = window.get_geometry()
+		xp, yp, widthp, heightp = snapshot_of(window).geometry
 		return rect[0] <= xp < (rect[0] + rect[2]) and rect[1] <= yp < (rect[1] + rect[3])
 
 	def from_json(self, json):
@@ -616,11 +912,21 @@ class Monitor:
 				'bottom': self.strut[3]
 			},
 			'clients': list(map(
-				lambda xid: {'xid': xid, 'name': windows.window_by_xid[xid].get_name(), 'index': self.clients.index(xid)},
-				self.clients
+				lambda item: {'xid': item[1], 'name': windows.window_by_xid[item[1]].get_name(), 'index': item[0]},
+				enumerate(self.clients)
 			))
 		}
 
+	def snapshot(self) -> Dict:
+		"""
+		The JSON of the monitor, built again only if its layout or clients changed since the last snapshot
+		"""
+		key = (self.id, self.nmaster, self.mfact, self.function_key, tuple(self.strut), tuple(self.clients))
+		if key != self.snapshot_key:
+			self.snapshot_key = key
+			self.json = self.to_json()
+		return self.json
+
 	def print(self):
 		print('monitor: {} {} {} {}'.format(self.wx, self.wy, self.ww, self.wh))
 
@@ -647,8 +953,10 @@ class Monitor:
 		if destination.get_workspace().get_number() != self.get_workspace().get_number():
 			for xid in self.clients:
 				windows.window_by_xid[xid].move_to_workspace(self.get_workspace())
+				forget_snapshot(windows.window_by_xid[xid])
 			for xid in destination.clients:
 				windows.window_by_xid[xid].move_to_workspace(destination.get_workspace())
+				forget_snapshot(windows.window_by_xid[xid])
 
 
 class Monitors:
@@ -659,6 +967,8 @@ class Monitors:
 		self.map: Dict[Tuple, Monitor] = {}
 		self.primaries: Dict[int, Monitor] = {}
 		self.by_workspace: Dict[int, List[Monitor]] = {}
+		self.by_client: Dict[int, List[Monitor]] = {}
+		self.pending: Dict[Tuple, List[int]] = {}
 		self.visible_ids = []
 
 	def read(self, screen: Wnck.Screen):
@@ -697,10 +1007,32 @@ class Monitors:
 		return self.map[(workspace.get_number(), gdk_monitor.get_model())]
 
 	def of_client(self, xid: int):
-		for monitor in self.map.values():
-			if xid in monitor.clients:
-				return monitor
-		return None
+		self.reconcile_all()
+		owners = self.by_client.get(xid)
+		return owners[0] if owners else None
+
+	def holding(self, xid: int) -> List[Monitor]:
+		self.reconcile_all()
+		return list(self.by_client.get(xid, ()))
+
+	def reconcile(self, monitor_id: Tuple):
+		"""
+		Brings the clients of the monitor in line with the windows bucketed for it by the last read,
+		keeping the order of the clients still inside and adding the new ones in stack order
+		"""
+		bucket = self.pending.pop(monitor_id, None)
+		if bucket is None or monitor_id not in self.map:
+			return
+		clients = self.map[monitor_id].clients
+		inside = set(bucket)
+		reconciled = [xid for xid in clients if xid in inside]
+		reconciled.extend(xid for xid in bucket if xid not in clients)
+		if reconciled != clients:
+			clients[:] = reconciled
+
+	def reconcile_all(self):
+		for monitor_id in list(self.pending.keys()):
+			self.reconcile(monitor_id)
 
 	def get_active(self, window: Wnck.Window = None) -> Monitor:
 		if not window:
@@ -739,8 +1071,7 @@ class ActiveMonitor:
 		monitor = monitors.get_active(active)
 		clients = monitor.clients
 		if promote_selected and active:
-			old_index = clients.index(active.get_xid())
-			clients.insert(0, clients.pop(old_index))
+			clients.promote(active.get_xid())
 
 		if user_event.parameters:
 			new_function_key = user_event.parameters[0]
@@ -811,7 +1142,7 @@ class Axis:
 		self.size_mask = size_mask
 
 	def position_of(self, window: Wnck.Window):
-		return window.get_geometry().xp if self is HORIZONTAL else window.get_geometry().yp
+		return snapshot_of(window).geometry[0 if self is HORIZONTAL else 1]
 
 
 def load(screen: Wnck.Screen):
@@ -859,16 +1190,27 @@ def restore_system_defaults():
 
 
 def persist():
+	"""
+	Schedules the workspace state to be written behind, if any monitor changed since the last call
+	"""
+	global persisted
 	screen = Wnck.Screen.get_default()
 	workspaces: List[Dict] = []
+	snapshots: List[Dict] = []
 
 	for workspace in screen.get_workspaces():
 		workspace_json = {'monitors': []}
 		workspaces.append(workspace_json)
 		for monitor in monitors.by_workspace[workspace.get_number()]:
-			workspace_json['monitors'].append(monitor.to_json())
+			snapshot = monitor.snapshot()
+			workspace_json['monitors'].append(snapshot)
+			snapshots.append(snapshot)
 
+	if len(snapshots) == len(persisted) and all(map(lambda a, b: a is b, snapshots, persisted)):
+		return
+	persisted = snapshots
 	state.persist_workspace(workspaces)
+	tracing.stamp('persist')
 
 
 #
@@ -902,6 +1244,13 @@ def resume():
 			dx, dy, dw, dh, str(compensate))
 
 	resume += '[gap] inner: {} outer: {}\n'.format(state.get_inner_gap(), state.get_outer_gap())
+	resume += '[configure] sent: {} suppressed: {}\n'.format(
+		wm.configure_counter['sent'], wm.configure_counter['suppressed'])
+	resume += '[window pool] size: {} hits: {} misses: {}\n'.format(
+		len(wm.window_pool), wm.window_pool_counter['hits'], wm.window_pool_counter['misses'])
+	from pocoy.controller import relayout_counter
+	resume += '[relayout] requested: {} applied: {} coalesced: {}\n'.format(
+		relayout_counter['requested'], relayout_counter['applied'], relayout_counter['coalesced'])
 	for workspace in Wnck.Screen.get_default().get_workspaces():
 		resume += 'Workspace {}\n'.format(workspace.get_number())
 		for i in range(Gdk.Display.get_default().get_n_monitors()):
@@ -939,3 +1288,4 @@ active_window = ActiveWindow()
 monitors: Monitors = Monitors()
 active_monitor: ActiveMonitor = ActiveMonitor()
 layout_changed_event: LayoutChangedEvent = LayoutChangedEvent()
+persisted: List[Dict] = []
@@ -16,7 +16,9 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 import re
-from typing import Callable
+import bisect
+import pocoy.state as state
+from typing import Callable, Dict, List
 
 from pocoy.wm import UserEvent
 
@@ -36,6 +38,56 @@ class Name:
 		self.complete = complete
 
 
+class Trie:
+	"""
+	Command names by prefix, each node keeping the sorted names it leads to
+	"""
+
+	def __init__(self):
+		self.children: Dict[str, Trie] = {}
+		self.names: List[str] = []
+
+	def insert(self, name: str):
+		node = self
+		node._keep(name)
+		for char in name:
+			if char not in node.children:
+				node.children[char] = Trie()
+			node = node.children[char]
+			node._keep(name)
+
+	def _keep(self, name: str):
+		index = bisect.bisect_left(self.names, name)
+		if index == len(self.names) or self.names[index] != name:
+			self.names.insert(index, name)
+
+	def with_prefix(self, prefix: str) -> List[str]:
+		node = self
+		for char in prefix:
+			node = node.children.get(char)
+			if not node:
+				return []
+		return node.names
+
+	def subsequence(self, query: str) -> List[str]:
+		"""
+		Names containing the query characters in order, the ones matching them earlier and closer together first
+		"""
+		ranked = []
+		self._subsequence(query, 0, 0, 0, 0, ranked)
+		return [score[-1] for score in sorted(ranked)]
+
+	def _subsequence(self, query: str, depth: int, matched: int, first: int, gaps: int, ranked: List):
+		if matched == len(query):
+			ranked.extend((gaps, first, len(name), name) for name in self.names)
+			return
+		for char, child in self.children.items():
+			if char == query[matched]:
+				child._subsequence(query, depth + 1, matched + 1, first if matched else depth, gaps, ranked)
+			else:
+				child._subsequence(query, depth + 1, matched, first, gaps + 1 if matched else gaps, ranked)
+
+
 class PromptHistory:
 
 	def __init__(self):
@@ -72,6 +124,9 @@ class PromptHistory:
 			self.history.append(cmd)
 
 
+NAME_TRIE: Trie = Trie()
+
+
 class InvalidName(Exception):
 
 	def __init__(self, message):
@@ -82,13 +137,16 @@ def add(name):
 	LIST.append(name)
 	NAME_MAP[name.name] = name
 	ALIAS_MAP[name.alias] = name
+	NAME_TRIE.insert(name.name)
 
 
 def completions_for(c_in: UserEvent):
 	user_input = c_in.vim_command
-	filtered = filter(lambda n: n.startswith(user_input) if user_input else True, NAME_MAP.keys())
-	filtered = filter(lambda n: n != user_input, filtered)
-	return sorted(list(set(filtered)))
+	if state.is_fuzzy_completion():
+		completions = NAME_TRIE.subsequence(user_input)
+	else:
+		completions = NAME_TRIE.with_prefix(user_input)
+	return [name for name in completions if name != user_input]
 
 
 def has_multiple_names(command_input):
@@ -100,9 +158,9 @@ def match(command_input) -> Name:
 	"""
 	Returns matching command function if any
 	"""
-	if vim_command in NAME_MAP.keys():
+	if vim_command in NAME_MAP:
 		return NAME_MAP[vim_command]
-	elif vim_command in ALIAS_MAP.keys():
+	elif vim_command in ALIAS_MAP:
 		return ALIAS_MAP[vim_command]
 
 	return None
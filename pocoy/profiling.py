@@ -0,0 +1,91 @@
+"""
+Copyright 2017 Pedro Santos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import re
+import cProfile
+from datetime import datetime
+from typing import Callable, Dict
+
+
+def start(path: str):
+	global directory
+	os.makedirs(path, exist_ok=True)
+	directory = path
+
+
+def stop():
+	"""
+	Dumps the profiles accumulated by the signal handlers and stops profiling
+	"""
+	global directory
+	if not directory:
+		return
+	for name, profile in accumulated.items():
+		_dump(profile, 'signal-' + name, directory)
+	accumulated.clear()
+	directory = None
+
+
+def is_profiling() -> bool:
+	return directory is not None
+
+
+def profile_command(name: str, function: Callable, *args):
+	"""
+	Runs the command, dumping its profile to a file of its own if profiling
+	"""
+	if not directory or active:
+		return function(*args)
+	path = directory
+	profile = cProfile.Profile()
+	try:
+		return _run(profile, function, *args)
+	finally:
+		# the command may be the one stopping the profiling
+		if directory:
+			_dump(profile, name, path)
+
+
+def profile_handler(name: str, function: Callable, *args, **kwargs):
+	"""
+	Runs the signal handler, accumulating its profile with the previous calls until profiling stops
+	"""
+	if not directory or active:
+		return function(*args, **kwargs)
+	if name not in accumulated:
+		accumulated[name] = cProfile.Profile()
+	return _run(accumulated[name], function, *args, **kwargs)
+
+
+def _run(profile: cProfile.Profile, function: Callable, *args, **kwargs):
+	active.append(profile)
+	profile.enable()
+	try:
+		return function(*args, **kwargs)
+	finally:
+		profile.disable()
+		active.pop()
+
+
+def _dump(profile: cProfile.Profile, name: str, path: str):
+	file_name = '{}-{}.pstats'.format(datetime.now().strftime('%Y%m%d-%H%M%S.%f'), re.sub(r'[^\w.-]', '_', name))
+	profile.dump_stats(os.path.join(path, file_name))
+
+
+directory: str = None
+active = []
+accumulated: Dict[str, cProfile.Profile] = {}
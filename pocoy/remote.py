@@ -25,9 +25,10 @@ from dbus.proxies import ProxyObject
 
 class ForeignInterface (ExportedGObject):
 
-	def __init__(self, ipc_handler: Callable = None, stop: Callable = None):
+	def __init__(self, ipc_handler: Callable = None, stop: Callable = None, stats: Callable = None):
 		self.ipc_handler = ipc_handler
 		self.stop = stop
+		self.stats = stats
 
 		bus_name = dbus.service.BusName(SERVICE_NAME, BUS)
 		super(ForeignInterface, self).__init__(conn=BUS, object_path=SERVICE_OBJECT_PATH, bus_name=bus_name)
@@ -44,6 +45,10 @@ class ForeignInterface (ExportedGObject):
 	def stop(self):
 		self.stop()
 
+	@dbus.service.method("io.github.pocoy.Service", in_signature='', out_signature='s')
+	def get_stats(self):
+		return self.stats()
+
 
 class Proxy:
 
@@ -59,13 +64,17 @@ class Proxy:
 		get_remote_id = self.dbus_proxy.get_dbus_method('get_id', 'io.github.pocoy.Service')
 		return get_remote_id()
 
+	def get_stats(self):
+		get_remote_stats = self.dbus_proxy.get_dbus_method('get_stats', 'io.github.pocoy.Service')
+		return get_remote_stats()
+
 	def stop_running_instance(self):
 		quit_function = self.dbus_proxy.get_dbus_method('stop', 'io.github.pocoy.Service')
 		quit_function()
 
 
-def export(ipc_handler: Callable = None, stop: Callable = None) -> ForeignInterface:
-	return ForeignInterface(ipc_handler=ipc_handler, stop=stop)
+def export(ipc_handler: Callable = None, stop: Callable = None, stats: Callable = None) -> ForeignInterface:
+	return ForeignInterface(ipc_handler=ipc_handler, stop=stop, stats=stats)
 
 
 def release():
@@ -66,6 +66,7 @@ def toggle(c_in):
 			return 'scratchpad name matches more than one window title'
 		if pocoy.wm.is_visible(matching[0], workspace=Wnck.Screen.get_default().get_active_workspace()):
 			matching[0].minimize()
+			pocoy.wm.forget_snapshot(matching[0])
 		else:
 			matching[0].activate_transient(c_in.time)
 	else:
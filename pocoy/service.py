@@ -20,7 +20,7 @@ x11 = ctypes.cdll.LoadLibrary('libX11.so.6')
 xlib_support_initialized = x11.XInitThreads()
 if not xlib_support_initialized:
 	raise Exception('Unable to initialize Xlib support for multiple threads.')
-import os, gi, signal, setproctitle, traceback
+import os, gi, signal, setproctitle, threading, traceback
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
 gi.require_version('Wnck', '3.0')
@@ -38,12 +38,15 @@ import pocoy.remote as remote
 import pocoy.model as model
 import pocoy.controller as controller
 import pocoy.desktop as desktop
+import pocoy.tracing as tracing
+import pocoy.profiling as profiling
 from gi.repository import Wnck, Gtk, GLib
 from datetime import datetime
 from types import ModuleType
-from typing import Callable
+from typing import Callable, Deque, List
+from collections import deque
 from pocoy.reading import Reading
-from pocoy.keyboard import KeyboardListener, Key, keyboard_grab_event
+from pocoy.keyboard import KeyboardListener, Key, keyboard_grab_event, SOURCES
 from pocoy.wm import UserEvent
 
 
@@ -82,9 +85,9 @@ def start():
 
 	model.layout_changed_event.add_callback(lambda: desktop.status_icon.reload())
 	keyboard_grab_event.add_callback(lambda: desktop.status_icon.reload())
-	keyboard_listener.start()
+	keyboard_listener.start(source=SOURCES[state.get_key_source()](), chord_timeout=state.get_chord_timeout())
 	GLib.idle_add(configure_active_environment, priority=GLib.PRIORITY_HIGH)
-	remote.export(ipc_handler=message, stop=stop)
+	remote.export(ipc_handler=message, stop=stop, stats=report)
 
 	Gtk.main()
 	print("Ending pocoy service, pid: {}".format(os.getpid()))
@@ -106,6 +109,8 @@ def stop():
 	controller.disconnect_from(Wnck.Screen.get_default())
 	desktop.disconnect_from(Wnck.Screen.get_default())
 	model.restore_system_defaults()
+	profiling.stop()
+	state.flush()
 	GLib.idle_add(Gtk.main_quit, priority=GLib.PRIORITY_HIGH)
 
 
@@ -116,6 +121,29 @@ def read_screen(user_event: UserEvent):
 	messages.add(text=model.resume())
 
 
+def stats(user_event: UserEvent):
+	messages.add(text=report())
+
+
+def profile(user_event: UserEvent):
+	parameters = user_event.vim_command_parameter.split()
+	action = parameters[0] if parameters else None
+	if action == 'start':
+		directory = parameters[1] if len(parameters) > 1 else os.path.join(state.cache_dir, 'profile')
+		profiling.start(directory)
+		messages.add(text='Profiling commands into {}'.format(directory))
+	elif action == 'stop':
+		profiling.stop()
+		messages.add(text='Profiling stopped')
+	else:
+		messages.add_error('Usage: profile start [directory] | stop')
+
+
+def complete_profile(user_event: UserEvent):
+	option = user_event.vim_command_parameter.strip()
+	return list(filter(lambda action: action.startswith(option), ['start', 'stop']))
+
+
 def reload(user_event: UserEvent):
 	desktop.notify_context_change()
 	state.reload()
@@ -136,6 +164,7 @@ def key_handler(key: Key, x_key_event, multiplier=1):
 
 	user_event = UserEvent(
 		time=x_key_event.time, parameters=key.parameters, keyval=x_key_event.keyval, keymod=x_key_event.keymod)
+	user_event.trace = tracing.Trace('key')
 
 	if hasattr(key.function, 'skip_event_processing') and key.function.skip_event_processing:
 		key.function(user_event)
@@ -155,6 +184,7 @@ def execute(function: Callable = None, cmd: str = None, timestamp: int = None, m
 	if not timestamp:
 		timestamp = datetime.now().microsecond
 	user_event = UserEvent(text=cmd, time=timestamp)
+	user_event.trace = tracing.Trace('received')
 
 	if cmd:
 		if names.has_multiple_names(cmd):
@@ -175,14 +205,31 @@ def execute(function: Callable = None, cmd: str = None, timestamp: int = None, m
 	return True
 
 
+def report() -> str:
+	return '{}\n[command queue] queued: {} merged: {} dropped: {}'.format(
+		tracing.report(), command_queue.counter['queued'], command_queue.counter['merged'],
+		command_queue.counter['dropped'])
+
+
 #TODO: rename to not_repeating_call ?
 def call(function, user_event: UserEvent, multiplier=1):
+	name = getattr(function, '__qualname__', str(function))
+	profiling.profile_command(name, _call, name, function, user_event, multiplier)
+	return False
+
+
+def _call(name: str, function, user_event: UserEvent, multiplier: int):
+	tracing.activate(user_event.trace)
+	tracing.stamp('dispatched')
 	try:
 
 		_pre_processing()
+		tracing.stamp('pre_processed')
 
 		for i in range(multiplier):
+			tracing.stamp('entered')
 			return_message = function(user_event)
+			tracing.stamp('exited')
 			if isinstance(return_message, messages.Message):
 				messages.add(message=return_message)
 
@@ -191,10 +238,12 @@ def call(function, user_event: UserEvent, multiplier=1):
 	except Exception as inst:
 		msg = 'ERROR ({}) executing: {}'.format(str(inst), user_event.text)
 		print(traceback.format_exc())
+		model.windows.invalidate()
 		messages.add_error(msg)
 		reading.begin(user_event.time)
 
-	return False
+	finally:
+		tracing.finish(name)
 
 
 def _pre_processing():
@@ -222,7 +271,60 @@ def _post_processing(user_event: UserEvent):
 #
 def _execute_inside_main_loop(function, command_input, multiplier=1):
 
-	GLib.idle_add(call, function, command_input, multiplier, priority=GLib.PRIORITY_HIGH)
+	if command_input.trace:
+		command_input.trace.stamp('enqueued')
+	command_queue.put(function, command_input, multiplier)
+
+
+class CommandQueue:
+	"""
+	Hands commands from the key listener thread to the main loop, where a single idle callback drains them.
+	A command repeating the last one still queued is merged into it by raising its multiplier
+	"""
+
+	def __init__(self, size: int = 64):
+		self.size = size
+		self.commands: Deque[List] = deque()
+		self.lock = threading.Lock()
+		self.scheduled = False
+		self.counter = {'queued': 0, 'merged': 0, 'dropped': 0}
+
+	def put(self, function: Callable, user_event: UserEvent, multiplier: int = 1):
+		with self.lock:
+			if self.commands and self._repeats(self.commands[-1], function, user_event):
+				queued_event = self.commands[-1][1]
+				queued_event.time = user_event.time
+				# the merged command answers the latest key, so its latency is traced from that key
+				queued_event.trace = user_event.trace
+				self.commands[-1][2] += multiplier
+				self.counter['merged'] += 1
+			elif len(self.commands) >= self.size:
+				self.counter['dropped'] += 1
+				return
+			else:
+				self.commands.append([function, user_event, multiplier])
+				self.counter['queued'] += 1
+			if self.scheduled:
+				return
+			self.scheduled = True
+		GLib.idle_add(self.drain, priority=GLib.PRIORITY_HIGH)
+
+	def drain(self):
+		with self.lock:
+			commands = list(self.commands)
+			self.commands.clear()
+			self.scheduled = False
+		for function, user_event, multiplier in commands:
+			call(function, user_event, multiplier)
+		return False
+
+	@staticmethod
+	def _repeats(command: List, function: Callable, user_event: UserEvent) -> bool:
+		queued_function, queued_event, multiplier = command
+		same_input = (
+			(queued_event.parameters, queued_event.text, queued_event.keyval, queued_event.keymod)
+			== (user_event.parameters, user_event.text, user_event.keyval, user_event.keymod))
+		return queued_function is function and same_input
 
 
 def _signal_function():
@@ -246,3 +348,4 @@ SIGHUP = getattr(signal, "SIGHUP", None)
 
 reading: Reading = Reading(model.windows)
 keyboard_listener: KeyboardListener = KeyboardListener(callback=key_handler, on_error=stop)
+command_queue: CommandQueue = CommandQueue()
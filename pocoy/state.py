@@ -20,6 +20,9 @@ from xdg import DesktopEntry as Desktop
 from typing import Dict, List
 import os
 import json
+import threading
+import traceback
+import time
 
 
 POCOY_DESKTOP = 'pocoy.desktop'
@@ -45,7 +48,12 @@ DEFAULT_PARAMETERS = {
 	'window_manger_border': 0,
 	'remove_decorations': True,
 	'inner_gap': 5,
-	'outer_gap': 5
+	'outer_gap': 5,
+	'synchronous_layout': False,
+	'relayout_debounce': 0,
+	'key_source': 'xlib',
+	'chord_timeout': 1000,
+	'fuzzy_completion': False
 }
 DEFAULT_WORKSPACES = {
 	'workspaces': [
@@ -71,6 +79,7 @@ DEFAULT_WORKSPACES = {
 def load(config_module_parameter: str = None):
 	global loaded_workspaces, loaded_parameters, loaded_decorations, config_module
 
+	write_behind.flush()
 	config_module = read_config_module(config_module_parameter)
 
 	loaded_workspaces = _read_json(workspace_file)
@@ -120,6 +129,7 @@ def force_defaults():
 
 
 def clean():
+	write_behind.discard(workspace_file)
 	if os.path.exists(workspace_file):
 		os.remove(workspace_file)
 	if os.path.exists(parameters_file):
@@ -136,13 +146,89 @@ def persist_parameters():
 
 def persist_workspace(workspace: List[Dict] = None):
 	loaded_workspaces['workspaces'] = workspace
-	with open(workspace_file, 'w') as f:
-		json.dump(loaded_workspaces, f, indent=True)
+	write_behind.schedule(workspace_file, dict(loaded_workspaces))
 
 
 def persist_decorations(decoration_map: Dict):
-	with open(decorations_file, 'w') as f:
-		json.dump(decoration_map, f, indent=True)
+	write_behind.schedule(decorations_file, dict(decoration_map))
+
+
+def flush():
+	write_behind.flush()
+
+
+def _write_json(file, content):
+	temporary = file + '.tmp'
+	with open(temporary, 'w') as f:
+		json.dump(content, f, indent=True)
+	os.replace(temporary, file)
+
+
+class WriteBehind:
+	"""
+	Writes JSON files from a background thread once no new content was scheduled
+	for the delay, so bursts of changes cost a single write of the last content.
+	Content pending for max_delay is written even if changes keep coming.
+	The scheduled content must not be mutated afterwards.
+	"""
+
+	def __init__(self, delay: float, max_delay: float = None):
+		self.delay = delay
+		self.max_delay = max_delay if max_delay is not None else delay * 4
+		self.pending: Dict[str, object] = {}
+		self.deadline: float = None
+		self.first_scheduled: float = None
+		self.condition = threading.Condition()
+		self.writing = threading.Lock()
+		self.thread: threading.Thread = None
+		self.counter = {'scheduled': 0, 'written': 0}
+
+	def schedule(self, file: str, content):
+		with self.condition:
+			self.counter['scheduled'] += 1
+			now = time.monotonic()
+			if not self.pending:
+				self.first_scheduled = now
+			self.pending[file] = content
+			self.deadline = min(now + self.delay, self.first_scheduled + self.max_delay)
+			if not self.thread or not self.thread.is_alive():
+				self.thread = threading.Thread(target=self._run, name='pocoy-write-behind', daemon=True)
+				self.thread.start()
+			self.condition.notify()
+
+	def discard(self, file: str):
+		with self.writing, self.condition:
+			self.pending.pop(file, None)
+
+	def flush(self):
+		with self.writing:
+			self._write(self._take())
+
+	def _take(self) -> Dict[str, object]:
+		with self.condition:
+			batch = self.pending
+			self.pending = {}
+			return batch
+
+	def _write(self, batch: Dict[str, object]):
+		for file, content in batch.items():
+			_write_json(file, content)
+			self.counter['written'] += 1
+
+	def _run(self):
+		while True:
+			with self.condition:
+				while not self.pending:
+					self.condition.wait()
+				remaining = self.deadline - time.monotonic()
+				if remaining > 0:
+					self.condition.wait(remaining)
+					continue
+			with self.writing:
+				try:
+					self._write(self._take())
+				except OSError:
+					traceback.print_exc()
 
 
 def _read_json(file):
@@ -206,6 +292,10 @@ def is_auto_select_first_hint() -> bool:
 	return loaded_parameters['auto_select_first_hint']
 
 
+def is_fuzzy_completion() -> bool:
+	return loaded_parameters['fuzzy_completion']
+
+
 def get_window_manger_border() -> int:
 	return loaded_parameters['window_manger_border']
 
@@ -240,6 +330,22 @@ def get_outer_gap() -> int:
 	return loaded_parameters['outer_gap']
 
 
+def is_synchronous_layout() -> bool:
+	return loaded_parameters['synchronous_layout']
+
+
+def get_relayout_debounce() -> int:
+	return loaded_parameters['relayout_debounce']
+
+
+def get_key_source() -> str:
+	return loaded_parameters['key_source']
+
+
+def get_chord_timeout() -> int:
+	return loaded_parameters['chord_timeout']
+
+
 def set_inner_gap(gap: int):
 	loaded_parameters['inner_gap'] = gap
 	persist_parameters()
@@ -276,3 +382,6 @@ def get_css_file_path():
 
 def get_custom_mappings_module_path():
 	return os.path.join(config_dir, "config.py")
+
+
+write_behind = WriteBehind(delay=0.5, max_delay=2)
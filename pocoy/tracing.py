@@ -0,0 +1,127 @@
+"""
+Copyright 2017 Pedro Santos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import time
+from collections import deque
+from typing import List, Tuple, Dict, Deque
+
+
+class Trace:
+	"""
+	Instants a command went through, from its receipt to the end of its execution
+	"""
+
+	def __init__(self, stage: str = 'received'):
+		self.stamps: List[Tuple[str, float]] = []
+		self.stamp(stage)
+
+	def stamp(self, stage: str):
+		self.stamps.append((stage, time.perf_counter()))
+
+	def elapsed(self) -> Dict[str, float]:
+		"""
+		Milliseconds from the receipt to the first time each stage was reached
+		"""
+		origin = self.stamps[0][1]
+		elapsed = {}
+		for stage, instant in self.stamps:
+			if stage not in elapsed:
+				elapsed[stage] = (instant - origin) * 1000
+		return elapsed
+
+
+class Histogram:
+	"""
+	The last samples of a command, in milliseconds
+	"""
+
+	def __init__(self):
+		self.count = 0
+		self.samples: Deque[float] = deque(maxlen=SAMPLES)
+		self.stages: Dict[str, Deque[float]] = {}
+
+	def add(self, trace: Trace):
+		elapsed = trace.elapsed()
+		self.count += 1
+		self.samples.append(trace_latency(trace))
+		for stage in elapsed:
+			if stage not in self.stages:
+				self.stages[stage] = deque(maxlen=SAMPLES)
+			self.stages[stage].append(elapsed[stage])
+
+	def percentiles(self, samples=None) -> Tuple[float, float, float]:
+		ordered = sorted(self.samples if samples is None else samples)
+		return tuple(percentile(ordered, p) for p in (50, 95, 99))
+
+
+def percentile(ordered: List[float], p: int) -> float:
+	if not ordered:
+		return 0
+	return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def trace_latency(trace: Trace) -> float:
+	return (trace.stamps[-1][1] - trace.stamps[0][1]) * 1000
+
+
+#
+# API
+#
+def activate(trace: Trace):
+	"""
+	Makes the trace receive the stamps of the code running on behalf of the command until it finishes
+	"""
+	active.append(trace)
+
+
+def stamp(stage: str):
+	if active and active[-1]:
+		active[-1].stamp(stage)
+
+
+def finish(command: str):
+	trace = active.pop() if active else None
+	if not trace:
+		return
+	trace.stamp('done')
+	record(command, trace)
+
+
+def record(name: str, trace: Trace):
+	if name not in histograms:
+		histograms[name] = Histogram()
+	histograms[name].add(trace)
+
+
+def report() -> str:
+	lines = []
+	for command in sorted(histograms.keys()):
+		histogram = histograms[command]
+		lines.append('{:24} count: {:6d} p50: {:8.2f} p95: {:8.2f} p99: {:8.2f} ms'.format(
+			command, histogram.count, *histogram.percentiles()))
+		for stage, samples in histogram.stages.items():
+			lines.append('\t{:16} p50: {:8.2f} p95: {:8.2f} p99: {:8.2f} ms'.format(
+				stage, *histogram.percentiles(samples)))
+	return '\n'.join(lines) if lines else 'No command traced'
+
+
+def reset():
+	histograms.clear()
+
+
+SAMPLES = 1024
+active: List[Trace] = []
+histograms: Dict[str, Histogram] = {}
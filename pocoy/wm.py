@@ -16,16 +16,28 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import os
 import re
+from collections import OrderedDict
 import pocoy.state as config
-from gi.repository import Wnck, GdkX11, Gdk, Gio
+from gi.repository import Wnck, GdkX11, Gdk, Gio, GLib
 from datetime import datetime
-from typing import Callable
+from typing import Callable, Dict, List, Set, Tuple
 from pocoy import scratchpads
 
 
 X_Y_W_H_GEOMETRY_MASK = Wnck.WindowMoveResizeMask.HEIGHT | Wnck.WindowMoveResizeMask.WIDTH | Wnck.WindowMoveResizeMask.X | Wnck.WindowMoveResizeMask.Y
 geometry_cache = {}
 adjustment_cache = {}
+settled_cache = {}
+# windows sent a configure request whose CONFIGURE did not arrive yet
+requested: Set[int] = set()
+decoration_cache = {}
+configure_counter = {'sent': 0, 'suppressed': 0}
+window_pool: OrderedDict = OrderedDict()
+window_pool_counter = {'hits': 0, 'misses': 0}
+WINDOW_POOL_SIZE = 512
+acknowledgements: Dict[int, List[Tuple[Callable, int]]] = {}
+CONFIGURE_DEADLINE = 200
+snapshots: Dict[Wnck.Window, 'WindowSnapshot'] = None
 
 
 # https://lazka.github.io/pgi-docs/GdkX11-3.0/classes/X11Display.html
@@ -36,12 +48,23 @@ def gdk_window_for(window: Wnck.Window = None, xid: int = None) -> GdkX11.X11Win
 
 
 def window_for(xid: int = None) -> GdkX11.X11Window:
+	if xid in window_pool:
+		window_pool.move_to_end(xid)
+		window_pool_counter['hits'] += 1
+		return window_pool[xid]
+
+	window_pool_counter['misses'] += 1
 	display = GdkX11.X11Display.get_default()
 	try:
-		return GdkX11.X11Window.foreign_new_for_display(display, xid)
+		gdk_window = GdkX11.X11Window.foreign_new_for_display(display, xid)
 	except TypeError as e:
 		raise DirtyState('No state for window {}'.format(xid)) from e
 
+	window_pool[xid] = gdk_window
+	if len(window_pool) > WINDOW_POOL_SIZE:
+		window_pool.popitem(last=False)
+	return gdk_window
+
 
 #
 # WORKSPACE
@@ -76,14 +99,14 @@ def monitor_of(xid) -> Gdk.Monitor:
 #
 def is_visible(window: Wnck.Window, workspace: Wnck.Workspace = None, monitor: Gdk.Monitor = None) -> bool:
 	return (
-			not window.is_minimized()
+			not snapshot_of(window).minimized
 			and (not workspace or (window.is_in_viewport(workspace) and window.is_visible_on_workspace(workspace)))
 			and (not monitor or intersect(window, monitor))
 	)
 
 
 def is_buffer(window: Wnck.Window) -> bool:
-	return window.get_pid() != os.getpid() and not window.is_skip_tasklist()
+	return snapshot_of(window).buffer
 
 
 def is_on_primary_monitor(window: Wnck.Window):
@@ -98,18 +121,20 @@ def get_last_focused(window_filter: Callable = None):
 
 
 def is_managed(window):
-	return is_buffer(window) and window.get_name() not in scratchpads.names()
+	snapshot = snapshot_of(window)
+	return snapshot.buffer and snapshot.name not in scratchpads.names()
 
 
 def intersect(window: Wnck.Window, monitor: Gdk.Monitor):
 	rect = monitor.get_workarea()
-	xp, yp, widthp, heightp = window.get_geometry()
+	xp, yp, widthp, heightp = snapshot_of(window).geometry
 	return rect.x <= xp < (rect.x + rect.width) and rect.y <= yp < (rect.y + rect.height)
 
 
 def unmaximize(window: Wnck.Window):
 	if window.is_maximized() or window.is_maximized_vertically() or window.is_maximized_horizontally():
 		window.unmaximize()
+		forget_snapshot(window)
 
 
 #
@@ -132,7 +157,10 @@ def resize(window: Wnck.Window, rectangle: Gdk.Rectangle = None, l=0, t=0, w=0,
 	set_geometry(window, x=new_x, y=new_y, w=new_width, h=new_height)
 
 
-def set_geometry(window: Wnck.Window, x=None, y=None, w=None, h=None, synchronous=False, raise_exceptions=True, layoutaxis: Callable = None):
+def set_geometry(window: Wnck.Window, x=None, y=None, w=None, h=None, raise_exceptions=True, layoutaxis: Callable = None):
+	"""
+	Returns True if a configure request was sent, False if the window is already at the geometry
+	"""
 
 	if not w and not h:
 		geometry = window.get_geometry()
@@ -145,34 +173,80 @@ def set_geometry(window: Wnck.Window, x=None, y=None, w=None, h=None, synchronou
 	xo, yo, wo, ho = calculate_geometry_offset(window)
 	x, y, w, h = x + xo, y + yo, w + wo, h + ho
 	x, y, w, h = int(x), int(y), int(w), int(h)
+	if is_committed(window, (x, y, w, h)):
+		configure_counter['suppressed'] += 1
+		return False
+
 	geometry_cache[window.get_xid()] = (x, y, w, h)
 	adjustment_cache[window.get_xid()] = False
+	requested.add(window.get_xid())
+	configure_counter['sent'] += 1
 	window.set_geometry(Wnck.WindowGravity.STATIC, X_Y_W_H_GEOMETRY_MASK, x, y, w, h)
+	forget_snapshot(window)
+	return True
 
-	if synchronous:
-		synchronized = wait_configure_event(
-			window.get_xid(), Gdk.EventType.CONFIGURE, Gdk.Display.get_default())
-		return synchronized
 
-	return False
+def is_committed(window: Wnck.Window, geometry):
+	"""
+	If the geometry was the last one requested for the window and it did not move since it was configured
+	"""
+	xid = window.get_xid()
+	return (
+			geometry_cache.get(xid) == geometry
+			and xid in settled_cache and settled_cache[xid] == tuple(window.get_geometry()))
 
 
-def wait_configure_event(xid, type, display: Gdk.Display):
-	limit = 100000
-	queue = []
-	try:
-		while limit > 0:
-			limit -= 1
-			e = display.get_event()
-			if e:
-				queue.append(e)
-				if e.get_event_type() == type and e.get_window().get_xid() == xid:
-					return True
-		return False
-	finally:
-		for e in queue:
-			e.put()
-		del queue[:]
+def settle(window: Wnck.Window):
+	"""
+	Records where the window settled if the CONFIGURE answers a request, a window moved by the user is not committed
+	"""
+	if window.get_xid() not in requested:
+		return
+	requested.discard(window.get_xid())
+	settled_cache[window.get_xid()] = tuple(window.get_geometry())
+
+
+def forget(xid: int):
+	geometry_cache.pop(xid, None)
+	adjustment_cache.pop(xid, None)
+	settled_cache.pop(xid, None)
+	requested.discard(xid)
+	decoration_cache.pop(xid, None)
+	window_pool.pop(xid, None)
+	for callback, source in acknowledgements.pop(xid, []):
+		GLib.source_remove(source)
+		callback(False)
+
+
+def flush():
+	Gdk.Display.get_default().flush()
+
+
+#
+# CONFIGURE ACKNOWLEDGEMENT
+#
+def await_configure(xid: int, callback: Callable[[bool], None], deadline: int = CONFIGURE_DEADLINE):
+	"""
+	Calls back with True once the window is configured, or with False if the deadline, in milliseconds, passes first
+	"""
+	source = GLib.timeout_add(deadline, _expire_configure, xid, callback)
+	acknowledgements.setdefault(xid, []).append((callback, source))
+
+
+def acknowledge_configure(xid: int):
+	for callback, source in acknowledgements.pop(xid, []):
+		GLib.source_remove(source)
+		callback(True)
+
+
+def _expire_configure(xid: int, callback: Callable[[bool], None]):
+	waiting = [w for w in acknowledgements.get(xid, []) if w[0] is not callback]
+	if waiting:
+		acknowledgements[xid] = waiting
+	else:
+		acknowledgements.pop(xid, None)
+	callback(False)
+	return False
 
 
 def get_width(window: Wnck.Window):
@@ -186,12 +260,10 @@ def get_height(window: Wnck.Window):
 
 
 def get_size(window: Wnck.Window):
-	dx, dy, dw, dh = decoration_delta(window)
+	is_decorated, decorations, (dx, dy, dw, dh) = get_decoration(window)
 	with Trap():
 		gx, gy, gw, gh = gdk_window_for(window).get_geometry()
 
-	with Trap():
-		is_decorated, decorations = gdk_window_for(window).get_decorations()
 	client_side_decoration = is_decorated and not decorations and dh < 0
 	border_compensation = (config.get_window_manger_border() * 2 if client_side_decoration else 0)
 
@@ -200,9 +272,7 @@ def get_size(window: Wnck.Window):
 
 def calculate_geometry_offset(window: Wnck.Window):
 	border_compensation = config.get_window_manger_border()
-	with Trap():
-		is_decorated, decorations = gdk_window_for(window).get_decorations()
-	dx, dy, dw, dh = decoration_delta(window)
+	is_decorated, decorations, (dx, dy, dw, dh) = get_decoration(window)
 	client_side_decoration = is_decorated and not decorations and dx < 0 and dy < 0
 	has_title = (
 			Gdk.WMDecoration.TITLE & decorations
@@ -222,6 +292,23 @@ def calculate_geometry_offset(window: Wnck.Window):
 	return 0, 0, 0, 0
 
 
+def get_decoration(window: Wnck.Window):
+	"""
+	:return: the decoration flags and the delta between the frame and the client window,
+	cached until the frame extents or the decorations change
+	"""
+	xid = window.get_xid()
+	if xid not in decoration_cache:
+		with Trap():
+			is_decorated, decorations = gdk_window_for(window).get_decorations()
+		decoration_cache[xid] = (is_decorated, decorations, decoration_delta(window))
+	return decoration_cache[xid]
+
+
+def invalidate_decoration(xid: int):
+	decoration_cache.pop(xid, None)
+
+
 def decoration_delta(window: Wnck.Window):
 	with Trap():
 		wx, wy, ww, wh = window.get_geometry()
@@ -256,6 +343,76 @@ class Trap:
 			raise DirtyState('X11 Error code {}'.format(error)) from exception
 
 
+#
+# SNAPSHOT
+#
+class WindowSnapshot:
+	"""
+	Properties of a window, each one read from the window the first time it is asked for and kept
+	afterwards, shared by every predicate during a command
+	"""
+	__slots__ = ('window', 'geometry', 'minimized', 'workspace', 'buffer', 'name')
+
+	def __init__(self, window: Wnck.Window):
+		super().__setattr__('window', window)
+
+	def __getattr__(self, name):
+		if name not in READERS:
+			raise AttributeError(name)
+		value = READERS[name](self.window)
+		super().__setattr__(name, value)
+		return value
+
+	def __setattr__(self, name, value):
+		raise AttributeError('Window snapshots are immutable')
+
+
+class SnapshotScope:
+	"""
+	Keeps the window snapshots taken inside it, the outermost scope discards them on exit
+	"""
+
+	def __enter__(self):
+		global snapshots
+		self.outermost = snapshots is None
+		if self.outermost:
+			snapshots = {}
+		return self
+
+	def __exit__(self, type, exception, exception_traceback):
+		global snapshots
+		if self.outermost:
+			snapshots = None
+
+
+def snapshot_of(window: Wnck.Window) -> WindowSnapshot:
+	"""
+	The snapshot of the window kept by the current scope, or one for a single read outside any scope
+	"""
+	if snapshots is None:
+		return WindowSnapshot(window)
+	if window not in snapshots:
+		snapshots[window] = WindowSnapshot(window)
+	return snapshots[window]
+
+
+def forget_snapshot(window: Wnck.Window):
+	"""
+	Drops the snapshot of a window the command changed, so the next predicates read it again
+	"""
+	if snapshots is not None:
+		snapshots.pop(window, None)
+
+
+READERS = {
+	'geometry': lambda window: tuple(window.get_geometry()),
+	'minimized': lambda window: window.is_minimized(),
+	'workspace': lambda window: window.get_workspace(),
+	'buffer': lambda window: window.get_pid() != os.getpid() and not window.is_skip_tasklist(),
+	'name': lambda window: window.get_name(),
+}
+
+
 class UserEvent:
 
 	colon_spacer = ''
@@ -265,6 +422,7 @@ class UserEvent:
 	terminal_command = ''
 	terminal_command_spacer = ''
 	terminal_command_parameter = ''
+	trace = None
 
 	def __init__(self, time=None, text=None, parameters=None, keyval=None, keymod=None):
 		self.time = time if time else datetime.now().microsecond
@@ -6,14 +6,27 @@ import tests.layout
 import tests.service
 import tests.model
 import tests.state
+import tests.wm
+import tests.controller
+import tests.decoration
+import tests.tracing
+import tests.profiling
+import tests.keyboard
 
 test_case_classes = (tests.names.CommandInputTestCase,
+                     tests.names.CompletionTestCase,
                      tests.terminal.TerminalTestCase,
                      tests.assistant.AssistantTestCase,
                      tests.layout.LayoutTestCase,
                      tests.service.ServiceTestCase,
                      tests.model.ModelTestCase,
                      tests.state.StateTestCase,
+                     tests.wm.WmTestCase,
+                     tests.controller.ControllerTestCase,
+                     tests.decoration.DecorationTestCase,
+                     tests.tracing.TracingTestCase,
+                     tests.profiling.ProfilingTestCase,
+                     tests.keyboard.KeyboardTestCase,
                      )
 
 
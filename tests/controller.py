@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pocoy.controller as controller
+
+
+class ControllerTestCase(unittest.TestCase):
+
+	def setUp(self):
+		controller.cancel_relayout()
+		self.monitor = MagicMock()
+		self.monitor.id = (0, None)
+		controller.windows = MagicMock()
+		controller.monitors = MagicMock()
+		controller.monitors.map = {self.monitor.id: self.monitor}
+		self.glib = patch.object(controller, 'GLib').start()
+		patch.object(controller, 'Trap').start()
+		patch.object(controller.state, 'get_relayout_debounce', return_value=0).start()
+		for key in controller.relayout_counter.keys():
+			controller.relayout_counter[key] = 0
+
+	def tearDown(self):
+		controller.cancel_relayout()
+		patch.stopall()
+
+	def test_coalesce_burst_into_one_relayout(self):
+		controller.schedule_relayout(self.monitor, unmaximize=True, decorate=True)
+		controller.schedule_relayout(self.monitor)
+		controller.schedule_relayout(self.monitor)
+
+		self.glib.idle_add.assert_called_once()
+		controller._relayout()
+
+		self.monitor.apply.assert_called_once_with(unmaximize=True)
+		controller.windows.apply_decoration_config.assert_called_once()
+		self.assertEqual(controller.relayout_counter['coalesced'], 2)
+
+	def test_debounce_relayout(self):
+		controller.state.get_relayout_debounce.return_value = 50
+		controller.schedule_relayout(self.monitor)
+		self.glib.timeout_add.assert_called_once_with(50, controller._relayout)
+		self.glib.idle_add.assert_not_called()
+
+	def test_postpone_relayout_while_windows_keep_changing(self):
+		controller.state.get_relayout_debounce.return_value = 50
+		with patch.object(controller.time, 'monotonic') as monotonic:
+			for now in (0, 0.03, 0.06):
+				monotonic.return_value = now
+				controller.schedule_relayout(self.monitor)
+
+		self.assertEqual(self.glib.timeout_add.call_count, 3)
+		self.assertEqual(self.glib.source_remove.call_count, 2)
+		self.glib.timeout_add.assert_called_with(50, controller._relayout)
+
+	def test_relayout_long_burst_after_max_wait(self):
+		controller.state.get_relayout_debounce.return_value = 50
+		with patch.object(controller.time, 'monotonic') as monotonic:
+			for now in (0, 0.04, 0.08, 0.12, 0.16, 0.19):
+				monotonic.return_value = now
+				controller.schedule_relayout(self.monitor)
+
+		self.glib.timeout_add.assert_called_with(10, controller._relayout)
+
+	def test_invalidate_model_when_incremental_update_fails(self):
+		controller.windows.update.side_effect = Exception('window gone')
+		with patch('sys.stderr'), patch('sys.stdout'):
+			controller._geometry_changed(MagicMock())
+			controller._workspace_changed(MagicMock())
+
+		self.assertEqual(controller.windows.invalidate.call_count, 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
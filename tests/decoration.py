@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pocoy.decoration as decoration
+from gi.repository import Gdk
+
+
+class DecorationTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.decorations = {}
+		self.gdk_window = MagicMock()
+		self.gdk_window.get_decorations.return_value = (True, Gdk.WMDecoration.ALL)
+		patch.object(decoration, 'window_for', return_value=self.gdk_window).start()
+		patch.object(decoration, 'invalidate_decoration').start()
+		patch.object(decoration.persistor, 'get_decorations', return_value=self.decorations).start()
+		self.persist_decorations = patch.object(decoration.persistor, 'persist_decorations').start()
+		decoration.undecorated.clear()
+		decoration.dirty = False
+
+	def tearDown(self):
+		patch.stopall()
+
+	def test_remove_title_once(self):
+		decoration.remove([1])
+		decoration.remove([1])
+		self.gdk_window.set_decorations.assert_called_once_with(Gdk.WMDecoration.BORDER)
+		self.persist_decorations.assert_called_once()
+
+	def test_restore_only_undecorated_windows(self):
+		decoration.remove([1])
+		self.gdk_window.reset_mock()
+		decoration.restore([1, 2])
+		decoration.restore([1, 2])
+		self.gdk_window.set_decorations.assert_called_once()
+		self.assertEqual(self.decorations, {})
+		self.assertEqual(self.persist_decorations.call_count, 2)
+
+
+if __name__ == '__main__':
+	unittest.main()
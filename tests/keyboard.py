@@ -0,0 +1,140 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from Xlib import X
+from Xlib.ext import record
+import pocoy.tracing as tracing
+import pocoy.model as model
+import pocoy.service as service
+from pocoy.keyboard import Key, KeyboardListener, RecordSource, KEY_EVENT, EVENT_SIZE
+from tests.service import buffers, focused_on_first
+
+J = 44
+Q = 24
+W = 25
+X_KEY = 53
+THREE = 12
+CONTROL_L = 37
+
+
+class KeyboardTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.keymap = patch('pocoy.keyboard.keymap').start()
+		self.keymap.translate_keyboard_state.side_effect = lambda code, mask, group: (
+			True, ord('3') if code == THREE else code * 10, 0, 0, 0)
+		tracing.reset()
+		display = patch('pocoy.keyboard.Display').start()
+		display.return_value.get_modifier_mapping.return_value = [[CONTROL_L]]
+		self.callback = MagicMock()
+		self.listener = KeyboardListener(callback=self.callback, on_error=MagicMock())
+		self.listener.thread = MagicMock()
+		self.listener.add(Key(code=J, mask=X.ControlMask))
+		self.combination = Key(code=W, mask=0)
+		self.listener.add(Key(code=Q, mask=X.ControlMask, combinations=[self.combination]))
+		self.listener.start()
+
+	def tearDown(self):
+		patch.stopall()
+
+	def press(self, code, state):
+		event = MagicMock(detail=code, state=state, time=0)
+		self.listener.handle_keypress(event)
+		return event
+
+	def test_grab_lock_variants_with_a_single_sync(self):
+		self.assertEqual(self.listener.root.grab_key.call_count, 16)
+		self.listener.connection.sync.assert_called_once()
+
+	def test_dispatch_raw_state_with_precomputed_keyval(self):
+		self.keymap.translate_keyboard_state.reset_mock()
+
+		event = self.press(J, X.ControlMask | X.Mod2Mask | X.LockMask)
+
+		self.callback.assert_called_once()
+		self.assertEqual(self.callback.call_args[0][0].code, J)
+		self.assertEqual(event.keyval, J * 10)
+		self.keymap.translate_keyboard_state.assert_not_called()
+
+	def test_dispatch_combination_with_unexpected_state(self):
+		self.press(Q, X.ControlMask)
+		self.assertTrue(self.listener.temporary_grab)
+
+		self.press(W, X.Button1Mask)
+
+		self.assertEqual(self.callback.call_args[0][0].code, W)
+		self.assertIs(self.listener.context, self.listener.root_context)
+
+	def test_count_typed_inside_combination_repeats_command(self):
+		self.press(Q, X.ControlMask)
+		self.press(THREE, X.Mod2Mask)
+		self.press(W, 0)
+
+		key, event, multiplier = self.callback.call_args[0]
+		self.assertEqual(key.code, W)
+		self.assertEqual(multiplier, 3)
+		self.assertEqual(self.listener.count, 0)
+
+	@patch('pocoy.service.GLib')
+	def test_count_repeats_navigation(self, glib):
+		stack = buffers(5)
+		self.combination.function = model.active_window.focusstack
+		self.combination.parameters = [1]
+		self.listener.callback = service.key_handler
+		with focused_on_first(stack), patch.object(service, 'reading'):
+			self.press(Q, X.ControlMask)
+			self.press(THREE, X.Mod2Mask)
+			self.press(W, 0)
+			service.command_queue.drain()
+
+		stack[3].activate_transient.assert_called_once()
+		for window in stack[:3] + stack[4:]:
+			window.activate_transient.assert_not_called()
+
+	def test_mistyped_combination_releases_keyboard(self):
+		self.press(Q, X.ControlMask)
+		self.press(X_KEY, 0)
+
+		self.assertFalse(self.listener.temporary_grab)
+		self.listener.connection.ungrab_keyboard.assert_called_once()
+		self.assertIn('aborted', tracing.histograms['<keyboard grab>'].stages)
+
+	def test_combination_expires(self):
+		self.listener.chord_timeout = 10
+		self.press(Q, X.ControlMask)
+		self.listener.timer.join()
+
+		self.assertFalse(self.listener.temporary_grab)
+		self.assertIs(self.listener.context, self.listener.root_context)
+		self.assertIn('expired', tracing.histograms['<keyboard grab>'].stages)
+
+	def test_ignore_unbound_key(self):
+		self.press(J, X.ShiftMask)
+		self.callback.assert_not_called()
+
+	def test_record_source_decodes_bound_keys_only(self):
+		source = RecordSource()
+		source.listener = self.listener
+		source.codes = {J, Q}
+		self.listener.connection.pending_events.side_effect = [1, 0]
+		data = wire_key_press(W, 0, 10) + wire_key_press(J, X.ControlMask | X.Mod2Mask, 11)
+
+		source.handle_reply(MagicMock(category=record.FromServer, client_swapped=False, data=data))
+
+		self.callback.assert_called_once()
+		key, event, multiplier = self.callback.call_args[0]
+		self.assertEqual(key.code, J)
+		self.assertEqual(event.time, 11)
+		self.assertEqual(event.keyval, J * 10)
+		self.listener.connection.next_event.assert_called_once()
+
+
+def wire_key_press(code, state, time):
+	data = bytearray(EVENT_SIZE)
+	data[0] = X.KeyPress
+	data[1] = code
+	KEY_EVENT.pack_into(data, 4, time, state)
+	return bytes(data)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,16 +1,18 @@
 import unittest
 from unittest.mock import MagicMock
-from unittest.mock import call
+from unittest.mock import call, patch
 
 import pocoy.model
 import pocoy.wm as wm
 wm.set_geometry = MagicMock()
 wm.set_geometry.return_value = False
 wm.calculate_geometry_offset = lambda x: [0, 0, 0, 0]
+wm.flush = MagicMock()
 
 import pocoy.state as state
 state.get_inner_gap = lambda: 0
 state.get_outer_gap = lambda: 0
+state.is_synchronous_layout = lambda: False
 
 import pocoy.layout as layout
 
@@ -18,7 +20,7 @@ import pocoy.layout as layout
 class LayoutTestCase(unittest.TestCase):
 
 	def setUp(self):
-		self.monitor = pocoy.model.Monitor(nmaster=1, mfact=0.5)
+		self.monitor = pocoy.model.Monitor((0, None), nmaster=1, mfact=0.5)
 		self.monitor.ww = 800
 		self.monitor.wh = 550
 		self.monitor.wx = 0
@@ -28,40 +30,166 @@ class LayoutTestCase(unittest.TestCase):
 		self.window_03 = MagicMock()
 		self.window_04 = MagicMock()
 		self.window_05 = MagicMock()
+		layout.placed.clear()
+		layout.reconciling.clear()
+		layout.awaiting.clear()
+		wm.set_geometry.reset_mock()
+		wm.set_geometry.return_value = True
 
 	def test_centeredmaster_two_window(self):
 		layout.centeredmaster([self.window_01, self.window_02], self.monitor)
 		wm.set_geometry.assert_has_calls([
-				call(self.window_01, synchronous=True, x=0, y=50, w=400, h=550),
-				call(self.window_02, synchronous=True, x=400, y=50, w=400, h=550)
-			])
+				call(self.window_01, x=0, y=50, w=400, h=550, layoutaxis=None),
+				call(self.window_02, x=400, y=50, w=400, h=550, layoutaxis=None)
+			], any_order=True)
 
 	def test_centeredmaster_three_window(self):
 		layout.centeredmaster([self.window_01, self.window_02, self.window_03], self.monitor)
 		wm.set_geometry.assert_has_calls([
-			call(self.window_01, synchronous=True, x=200, y=50, w=400, h=550),
-			call(self.window_02, synchronous=True, x=600, y=50, w=200, h=550),
-			call(self.window_03, synchronous=True, x=0, y=50, w=200, h=550)
-		])
+			call(self.window_01, x=200, y=50, w=400, h=550, layoutaxis=None),
+			call(self.window_02, x=600, y=50, w=200, h=550, layoutaxis=None),
+			call(self.window_03, x=0, y=50, w=200, h=550, layoutaxis=None)
+		], any_order=True)
 
 	def test_centeredmaster_four_window(self):
 		layout.centeredmaster([self.window_01, self.window_02, self.window_03, self.window_04], self.monitor)
 		wm.set_geometry.assert_has_calls([
-			call(self.window_01, synchronous=True, x=200, y=50, w=400, h=550),
-			call(self.window_02, synchronous=True, x=600, y=50, w=200, h=275),
-			call(self.window_03, synchronous=True, x=0, y=50, w=200, h=550),
-			call(self.window_04, synchronous=True, x=600, y=325, w=200, h=275)
-		])
+			call(self.window_01, x=200, y=50, w=400, h=550, layoutaxis=None),
+			call(self.window_02, x=600, y=50, w=200, h=275, layoutaxis=None),
+			call(self.window_03, x=0, y=50, w=200, h=550, layoutaxis=None),
+			call(self.window_04, x=600, y=325, w=200, h=275, layoutaxis=None)
+		], any_order=True)
 
 	def test_centeredmaster_5_window(self):
 		layout.centeredmaster([self.window_01, self.window_02, self.window_03, self.window_04, self.window_05], self.monitor)
 		wm.set_geometry.assert_has_calls([
-			call(self.window_01, synchronous=True, x=200, y=50, w=400, h=550),
-			call(self.window_02, synchronous=True, x=600, y=50, w=200, h=275),
-			call(self.window_03, synchronous=True, x=0, y=50, w=200, h=275),
-			call(self.window_04, synchronous=True, x=600, y=325, w=200, h=275),
-			call(self.window_05, synchronous=True, x=0, y=325, w=200, h=275)
-		])
+			call(self.window_01, x=200, y=50, w=400, h=550, layoutaxis=None),
+			call(self.window_02, x=600, y=50, w=200, h=275, layoutaxis=None),
+			call(self.window_03, x=0, y=50, w=200, h=275, layoutaxis=None),
+			call(self.window_04, x=600, y=325, w=200, h=275, layoutaxis=None),
+			call(self.window_05, x=0, y=325, w=200, h=275, layoutaxis=None)
+		], any_order=True)
+
+	def test_reconcile_column_after_refused_height(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_02.get_xid.return_value = 2
+		self.window_03.get_xid.return_value = 3
+		layout.tile([self.window_01, self.window_02, self.window_03], self.monitor)
+		wm.set_geometry.reset_mock()
+
+		with patch.object(layout, 'get_height', return_value=250):
+			layout.reconcile(2)
+
+		wm.set_geometry.assert_called_once_with(
+			self.window_03, x=400, y=300, w=400, h=300, layoutaxis=None)
+
+	def test_reconcile_nothing_if_size_accepted(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_02.get_xid.return_value = 2
+		layout.tile([self.window_01, self.window_02], self.monitor)
+		wm.set_geometry.reset_mock()
+
+		with patch.object(layout, 'get_height', return_value=550):
+			layout.reconcile(1)
+
+		wm.set_geometry.assert_not_called()
+
+	def test_dont_reconcile_suppressed_request(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_02.get_xid.return_value = 2
+		wm.set_geometry.return_value = False
+
+		layout.tile([self.window_01, self.window_02], self.monitor)
+
+		self.assertEqual(layout.reconciling, {})
+		self.assertEqual(layout.placed, {})
+
+	def test_tile_rectangles(self):
+		self.assertEqual(
+			layout.rectangles(layout.tile_strips, 3, (0, 50, 800, 550), 1, 0.5, 0),
+			((0, 50, 400, 550), (400, 50, 400, 275), (400, 325, 400, 275)))
+
+	def test_place_after_settled_window_refused_size(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_02.get_xid.return_value = 2
+		self.window_03.get_xid.return_value = 3
+		self.window_02.get_geometry.return_value = (400, 50, 400, 250)
+		layout.tile([self.window_01, self.window_02, self.window_03], self.monitor)
+		with patch.object(layout, 'get_height', return_value=250):
+			layout.reconcile(2)
+		wm.set_geometry.reset_mock()
+
+		layout.tile([self.window_01, self.window_02, self.window_03], self.monitor)
+
+		wm.set_geometry.assert_any_call(self.window_03, x=400, y=300, w=400, h=300, layoutaxis=None)
+
+	def test_arrow_floats_single_window(self):
+		with patch.object(layout, 'resize') as resize:
+			layout.arrow([self.window_01], self.monitor)
+
+		resize.assert_called_once_with(self.window_01, l=0.15, t=0.1, w=0.7, h=0.86)
+		wm.set_geometry.assert_not_called()
+
+	def test_skip_window_settled_on_its_rectangle(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_01.get_geometry.return_value = (0, 50, 800, 550)
+		layout.monocle([self.window_01], self.monitor)
+		with patch.object(layout, 'get_height', return_value=550):
+			layout.reconcile(1)
+		wm.set_geometry.reset_mock()
+
+		layout.monocle([self.window_01], self.monitor)
+
+		wm.set_geometry.assert_not_called()
+
+	def test_configure_settled_window_moved_since(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_01.get_geometry.return_value = (0, 50, 800, 550)
+		layout.monocle([self.window_01], self.monitor)
+		with patch.object(layout, 'get_height', return_value=550):
+			layout.reconcile(1)
+		wm.set_geometry.reset_mock()
+
+		self.window_01.get_geometry.return_value = (10, 50, 800, 550)
+		layout.monocle([self.window_01], self.monitor)
+
+		wm.set_geometry.assert_called_once()
+
+	def test_synchronous_column_waits_each_configure(self):
+		self.window_01.get_xid.return_value = 1
+		self.window_02.get_xid.return_value = 2
+		self.window_03.get_xid.return_value = 3
+		callbacks = {}
+		wm.set_geometry.return_value = True
+		try:
+			with patch.object(state, 'is_synchronous_layout', return_value=True), \
+					patch.object(layout, 'await_configure', side_effect=lambda xid, c: callbacks.update({xid: c})):
+				layout.tile([self.window_01, self.window_02, self.window_03], self.monitor)
+				self.assertEqual(set(callbacks.keys()), {1, 2})
+				self.assertEqual(wm.set_geometry.call_count, 2)
+
+				with patch.object(layout, 'get_height', return_value=250):
+					callbacks[2](True)
+		finally:
+			wm.set_geometry.return_value = False
+
+		wm.set_geometry.assert_called_with(self.window_03, x=400, y=300, w=400, h=300, layoutaxis=None)
+
+	@patch('pocoy.wm.GLib')
+	def test_synchronous_column_moves_on_when_awaited_window_closes(self, glib):
+		self.window_01.get_xid.return_value = 1
+		self.window_02.get_xid.return_value = 2
+		self.window_03.get_xid.return_value = 3
+		with patch.object(state, 'is_synchronous_layout', return_value=True), \
+				patch.object(layout, 'await_configure', side_effect=wm.await_configure):
+			layout.tile([self.window_01, self.window_02, self.window_03], self.monitor)
+			wm.forget(2)
+			layout.forget(2)
+
+		wm.set_geometry.assert_called_with(self.window_03, x=400, y=325, w=400, h=275, layoutaxis=None)
+		self.assertEqual(set(layout.awaiting.keys()), {1, 3})
+		wm.forget(1)
+		wm.forget(3)
 
 
 if __name__ == '__main__':
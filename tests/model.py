@@ -1,13 +1,13 @@
 import unittest
 import pocoy.model as model
 from pocoy.model import Monitor
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 workspace = MagicMock()
 workspace.get_number = lambda: 0
 screen = MagicMock()
 screen.get_workspaces = lambda: [workspace]
-monitor = Monitor(primary=True)
+monitor = Monitor((0, None), primary=True)
 model.monitors.primaries = {0: monitor}
 model.monitors.by_workspace = {0: [monitor]}
 
@@ -15,18 +15,132 @@ model.monitors.by_workspace = {0: [monitor]}
 class ModelTestCase(unittest.TestCase):
 
 	def test_read_user_config(self):
-		model.read_user_config(DEFAULTS, screen)
+		model.read_user_config(DEFAULTS)
 		primary: Monitor = model.monitors.get_primary(workspace)
 		self.assertEqual(primary.nmaster, 1)
 		self.assertEqual(primary.mfact, 0.55)
 		self.assertEqual(primary.function_key, 'T')
 
+	def test_remove_closed_window_from_index(self):
+		model.monitors.map = {monitor.id: monitor}
+		monitor.clients = [1, 2]
+		model.windows.window_by_xid = {1: MagicMock(), 2: MagicMock()}
+		model.windows.buffers = [1, 2]
+
+		model.windows.remove(1)
+
+		self.assertEqual(monitor.clients, [2])
+		self.assertEqual(model.windows.buffers, [2])
+		self.assertNotIn(1, model.windows.window_by_xid)
+
+	def test_warm_index_skips_screen_reading(self):
+		model.windows.dirty = False
+		with patch.object(model.windows, 'read') as read, patch.object(model.active_window, 'read_screen') as read_screen:
+			model.windows.sync(screen)
+		read.assert_not_called()
+		read_screen.assert_called_once()
+
+	def test_dirty_index_reads_screen(self):
+		model.windows.invalidate()
+		with patch.object(model.windows, 'read') as read:
+			model.windows.sync(screen)
+		read.assert_called_once_with(screen)
+
+	def test_persist_only_changed_state(self):
+		model.persisted = []
+		monitor.clients = []
+		with patch.object(model.Wnck.Screen, 'get_default', return_value=screen), \
+				patch.object(model.state, 'persist_workspace') as persist_workspace:
+			model.persist()
+			model.persist()
+			monitor.nmaster += 1
+			model.persist()
+			monitor.nmaster -= 1
+		self.assertEqual(persist_workspace.call_count, 2)
+
+	def test_index_client_monitor(self):
+		model.monitors.by_client.clear()
+		other = Monitor((1, None))
+		monitor.clients = [1, 2]
+		other.clients.append(3)
+		other.clients.insert(0, monitor.clients.pop(1))
+
+		self.assertIs(model.monitors.of_client(1), monitor)
+		self.assertIs(model.monitors.of_client(2), other)
+		self.assertEqual(other.clients.index(3), 1)
+		self.assertNotIn(2, monitor.clients)
+
+	def test_index_swapped_clients(self):
+		model.monitors.by_client.clear()
+		other = Monitor((1, None))
+		monitor.clients = [1]
+		other.clients = [2]
+		aux = other.clients
+		other.clients = monitor.clients
+		monitor.clients = aux
+
+		self.assertIs(model.monitors.of_client(1), other)
+		self.assertIs(model.monitors.of_client(2), monitor)
+
+	def test_move_client_keeps_positions(self):
+		monitor.clients = [1, 2, 3, 4]
+		monitor.clients.promote(3)
+		self.assertEqual(monitor.clients, [3, 1, 2, 4])
+		self.assertTrue(monitor.clients.move(1, -1))
+		self.assertEqual(monitor.clients, [1, 3, 2, 4])
+		self.assertTrue(monitor.clients.move(1, -1))
+		self.assertEqual(monitor.clients, [3, 2, 4, 1])
+		self.assertEqual([monitor.clients.index(xid) for xid in (3, 2, 4, 1)], [0, 1, 2, 3])
+		self.assertEqual(monitor.clients.neighbour(1, 1), 3)
+
+	def test_reconcile_pending_clients_on_first_use(self):
+		model.monitors.by_client.clear()
+		model.monitors.map = {monitor.id: monitor}
+		monitor.clients = [1, 2, 3]
+		model.monitors.pending[monitor.id] = [4, 3, 1]
+
+		self.assertEqual(monitor.clients, [1, 3, 4])
+		self.assertNotIn(monitor.id, model.monitors.pending)
+		self.assertIsNone(model.monitors.of_client(2))
+
+	def test_nearest_window_in_direction(self):
+		index = model.SpatialIndex()
+		index.put(1, (0, 0))
+		index.put(2, (400, 300))
+		index.put(3, (400, 0))
+		index.put(4, (800, 0))
+		index.put(4, (900, 0))
+
+		self.assertEqual(index.nearest(1, 1, 0, lambda xid: True), 3)
+		self.assertEqual(index.nearest(1, 1, 0, lambda xid: xid != 3), 2)
+		self.assertEqual(index.nearest(3, 1, 1, lambda xid: True), 2)
+		self.assertEqual(index.nearest(4, -1, 0, lambda xid: True), 3)
+		self.assertIsNone(index.nearest(1, -1, 0, lambda xid: True))
+		index.remove(3)
+		self.assertEqual(index.lines[0], [(0, 1), (400, 2), (900, 4)])
+
+	def test_window_line_kept_until_window_changes(self):
+		left, right = MagicMock(), MagicMock()
+		left.get_xid.return_value, right.get_xid.return_value = 1, 2
+		left.get_geometry.return_value, right.get_geometry.return_value = (0, 0, 10, 10), (400, 0, 10, 10)
+		model.windows.window_by_xid = {1: left, 2: right}
+		with patch.object(model.Wnck.Screen, 'get_default') as get_default, \
+				patch.object(model, 'in_visible_monitor', return_value=True):
+			get_default.return_value.get_windows.return_value = [right, left]
+			model.windows.invalidate()
+			self.assertEqual(model.windows.get_window_line(), [left, right])
+			self.assertIs(model.windows.get_line_neighbour(right, 1), left)
+			get_default.return_value.get_windows.return_value = [right]
+			self.assertEqual(model.windows.get_window_line(), [left, right])
+			model.windows.remove(1)
+			self.assertEqual(model.windows.get_window_line(), [right])
+
 
 DEFAULTS = {
 	'workspaces': [
 		{
 			'monitors': [
-				{'nmaster': 1, 'mfact': 0.55, 'function': 'T'},
+				{'workspace_number': 0, 'monitor_model': None, 'nmaster': 1, 'mfact': 0.55, 'function': 'T'},
 				{'nmaster': 1, 'mfact': 0.55, 'function': None}
 			]
 		},
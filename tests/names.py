@@ -1,4 +1,7 @@
 import unittest
+from unittest.mock import patch
+import pocoy.names as names
+import pocoy.state as state
 from pocoy.wm import UserEvent
 
 
@@ -82,5 +85,31 @@ class CommandInputTestCase(unittest.TestCase):
 		self.assertEqual(i.terminal_command_parameter, '')
 
 
+class CompletionTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.trie = names.Trie()
+		for name in ['buffers', 'bdelete', 'buffer', 'edit', 'buffer', 'only']:
+			self.trie.insert(name)
+
+	def test_prefix_completions_are_sorted(self):
+		self.assertEqual(self.trie.with_prefix('b'), ['bdelete', 'buffer', 'buffers'])
+		self.assertEqual(self.trie.with_prefix(''), ['bdelete', 'buffer', 'buffers', 'edit', 'only'])
+		self.assertEqual(self.trie.with_prefix('x'), [])
+
+	def test_subsequence_ranks_closer_matches_first(self):
+		self.assertEqual(self.trie.subsequence('bd'), ['bdelete'])
+		self.assertEqual(self.trie.subsequence('bf'), ['buffer', 'buffers'])
+		self.assertEqual(self.trie.subsequence('e'), ['edit', 'bdelete', 'buffer', 'buffers'])
+
+	@patch.object(state, 'is_fuzzy_completion', return_value=False)
+	def test_completions_skip_typed_name(self, is_fuzzy_completion):
+		with patch.object(names, 'NAME_TRIE', self.trie):
+			completions = names.completions_for(UserEvent(text='buffer'))
+		self.assertEqual(completions, ['buffers'])
+		completions.clear()
+		self.assertEqual(self.trie.with_prefix('buffer'), ['buffer', 'buffers'])
+
+
 if __name__ == '__main__':
 	unittest.main()
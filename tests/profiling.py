@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+import pocoy.profiling as profiling
+
+
+class ProfilingTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		profiling.start(self.directory.name)
+
+	def tearDown(self):
+		profiling.stop()
+		self.directory.cleanup()
+
+	def test_dump_each_command(self):
+		result = profiling.profile_command('ActiveWindow.zoom', lambda: profiling.profile_command('inner', sum, [1, 2]))
+		self.assertEqual(result, 3)
+		files = os.listdir(self.directory.name)
+		self.assertEqual(len(files), 1)
+		self.assertTrue(files[0].endswith('-ActiveWindow.zoom.pstats'))
+
+	def test_accumulate_handler_until_stop(self):
+		profiling.profile_handler('_window_opened', sum, [1])
+		profiling.profile_handler('_window_opened', sum, [2])
+		self.assertEqual(os.listdir(self.directory.name), [])
+		profiling.stop()
+		files = os.listdir(self.directory.name)
+		self.assertEqual(len(files), 1)
+		self.assertTrue(files[0].endswith('-signal-_window_opened.pstats'))
+
+	def test_stop_from_profiled_command(self):
+		profiling.profile_handler('_window_opened', sum, [1])
+		result = profiling.profile_command('profile', lambda: profiling.stop() or 3)
+		self.assertEqual(result, 3)
+		self.assertFalse(profiling.is_profiling())
+		files = os.listdir(self.directory.name)
+		self.assertEqual(len(files), 1)
+		self.assertTrue(files[0].endswith('-signal-_window_opened.pstats'))
+
+	def test_run_unprofiled_when_stopped(self):
+		profiling.stop()
+		self.assertEqual(profiling.profile_command('zoom', sum, [1, 2]), 3)
+		self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,7 +1,10 @@
 import unittest
 
-from unittest.mock import MagicMock
+from contextlib import ExitStack
+from unittest.mock import MagicMock, patch
 from pocoy.wm import UserEvent
+from pocoy.model import Monitor
+import pocoy.model as model
 import pocoy.service as service
 
 
@@ -31,6 +34,101 @@ class ServiceTestCase(unittest.TestCase):
 		service.call(self.foo, UserEvent())
 		service.reading.end.assert_not_called()
 
+	@patch('pocoy.service.GLib')
+	def test_merge_repeated_command(self, glib):
+		queue = service.CommandQueue()
+		queue.put(self.foo, UserEvent(parameters=[0.05]))
+		queue.put(self.foo, UserEvent(parameters=[0.05]))
+		queue.put(self.foo, UserEvent(parameters=[-0.05]))
+
+		glib.idle_add.assert_called_once_with(queue.drain, priority=glib.PRIORITY_HIGH)
+		self.assertEqual([command[2] for command in queue.commands], [2, 1])
+		self.assertEqual(queue.counter, {'queued': 2, 'merged': 1, 'dropped': 0})
+
+	@patch('pocoy.service.GLib')
+	def test_dont_merge_command_bound_to_other_key(self, glib):
+		queue = service.CommandQueue()
+		queue.put(self.foo, UserEvent(parameters=[0.05], keyval=106, keymod='<Ctrl>'))
+		queue.put(self.foo, UserEvent(parameters=[0.05], keyval=107, keymod='<Ctrl>'))
+		queue.put(self.foo, UserEvent(parameters=[0.05], keyval=107, keymod='<Alt>'))
+
+		self.assertEqual([command[2] for command in queue.commands], [1, 1, 1])
+
+	@patch('pocoy.service.GLib')
+	def test_merged_command_keeps_latest_trace(self, glib):
+		queue = service.CommandQueue()
+		first, latest = UserEvent(parameters=[0.05]), UserEvent(parameters=[0.05])
+		first.trace, latest.trace = MagicMock(), MagicMock()
+		queue.put(self.foo, first)
+		queue.put(self.foo, latest)
+
+		self.assertIs(queue.commands[0][1].trace, latest.trace)
+
+	@patch('pocoy.service.GLib')
+	def test_drop_command_when_queue_is_full(self, glib):
+		queue = service.CommandQueue(size=1)
+		queue.put(self.foo, UserEvent(parameters=[1]))
+		queue.put(self.foo, UserEvent(parameters=[-1]))
+
+		self.assertEqual(len(queue.commands), 1)
+		self.assertEqual(queue.counter['dropped'], 1)
+
+	@patch('pocoy.service.GLib')
+	def test_drain_calls_merged_command_once(self, glib):
+		queue = service.CommandQueue()
+		for i in range(10):
+			queue.put(self.foo, UserEvent(parameters=[0.05]))
+
+		queue.drain()
+
+		self.assertEqual(self.foo.call_count, 10)
+		service.reading.make_transient.assert_called_once()
+		self.assertFalse(queue.scheduled)
+		self.assertEqual(len(queue.commands), 0)
+
+	@patch('pocoy.service.GLib')
+	def test_merged_focus_command_moves_once_per_press(self, glib):
+		stack = buffers(3)
+		queue = service.CommandQueue()
+		focusstack = model.active_window.focusstack
+		with focused_on_first(stack):
+			for i in range(2):
+				queue.put(focusstack, UserEvent(parameters=[1]))
+			queue.drain()
+
+		self.assertEqual(queue.counter['merged'], 1)
+		stack[2].activate_transient.assert_called_once()
+		stack[1].activate_transient.assert_not_called()
+		self.assertFalse(model.windows.staging)
+
+
+def buffers(size):
+	stack = []
+	for xid in range(1, size + 1):
+		window = MagicMock()
+		window.get_xid.return_value = xid
+		window.is_skip_tasklist.return_value = False
+		stack.append(window)
+	return stack
+
+
+def focused_on_first(stack):
+	"""
+	X keeps reporting the first window as active, as it does until the navigation is committed
+	"""
+	model.windows.dirty = False
+	model.windows.staging = False
+	model.windows.buffers = [window.get_xid() for window in stack]
+	model.windows.window_by_xid = {window.get_xid(): window for window in stack}
+	monitor = Monitor((0, None))
+	monitor.clients = list(model.windows.buffers)
+	screen = MagicMock()
+	screen.get_active_window.return_value = stack[0]
+	patches = ExitStack()
+	patches.enter_context(patch.object(model.Wnck.Screen, 'get_default', return_value=screen))
+	patches.enter_context(patch.object(model.monitors, 'get_active', return_value=monitor))
+	return patches
+
 
 if __name__ == '__main__':
 	unittest.main()
@@ -1,4 +1,8 @@
+import json
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
 
 import pocoy.state as state
 
@@ -49,6 +53,26 @@ class StateTestCase(unittest.TestCase):
 		state.read_user_config(cache, pocoy)
 		self.assertEqual(5, cache['inner_gap'])
 
+	def test_write_behind_last_scheduled_content(self):
+		with tempfile.TemporaryDirectory() as directory:
+			file = os.path.join(directory, 'workspace.json')
+			writer = state.WriteBehind(delay=60)
+			writer.schedule(file, {'workspaces': 1})
+			writer.schedule(file, {'workspaces': 2})
+			writer.flush()
+			with open(file) as f:
+				self.assertEqual(json.load(f), {'workspaces': 2})
+			self.assertEqual(os.listdir(directory), ['workspace.json'])
+			self.assertEqual(writer.counter['written'], 1)
+
+	def test_write_behind_within_max_delay_despite_new_content(self):
+		writer = state.WriteBehind(delay=10, max_delay=30)
+		with patch.object(state.time, 'monotonic', side_effect=[100, 125]), \
+				patch.object(state.threading, 'Thread'):
+			writer.schedule('workspace.json', {'workspaces': 1})
+			writer.schedule('workspace.json', {'workspaces': 2})
+		self.assertEqual(writer.deadline, 130)
+
 
 if __name__ == '__main__':
 	unittest.main()
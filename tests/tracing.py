@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import patch
+
+import pocoy.tracing as tracing
+
+
+class TracingTestCase(unittest.TestCase):
+
+	def setUp(self):
+		tracing.reset()
+		del tracing.active[:]
+
+	def test_percentiles(self):
+		histogram = tracing.Histogram()
+		histogram.samples.extend(range(1, 101))
+		self.assertEqual(histogram.percentiles(), (51, 96, 100))
+
+	def test_record_stages_of_command(self):
+		with patch.object(tracing.time, 'perf_counter', side_effect=[1.0, 1.002, 1.010, 1.011]):
+			trace = tracing.Trace('key')
+			tracing.activate(trace)
+			tracing.stamp('dispatched')
+			tracing.stamp('read')
+			tracing.finish('focus_next')
+
+		histogram = tracing.histograms['focus_next']
+		self.assertAlmostEqual(histogram.samples[0], 11)
+		self.assertAlmostEqual(histogram.stages['read'][0], 10)
+		self.assertEqual(tracing.active, [])
+
+	def test_ignore_untraced_command(self):
+		tracing.activate(None)
+		tracing.stamp('read')
+		tracing.finish('focus_next')
+		self.assertEqual(tracing.histograms, {})
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pocoy.wm as wm
+
+
+class WmTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.window = MagicMock()
+		self.window.get_xid.return_value = 1
+		self.window.get_geometry.return_value = (0, 0, 400, 300)
+		wm.forget(1)
+
+	def request(self, geometry):
+		wm.geometry_cache[1] = geometry
+		wm.requested.add(1)
+
+	def test_committed_if_settled_on_the_last_geometry(self):
+		self.request((0, 0, 400, 300))
+		wm.settle(self.window)
+		self.assertTrue(wm.is_committed(self.window, (0, 0, 400, 300)))
+
+	def test_not_committed_if_not_settled(self):
+		self.request((0, 0, 400, 300))
+		self.assertFalse(wm.is_committed(self.window, (0, 0, 400, 300)))
+
+	def test_not_committed_if_moved_since_settled(self):
+		self.request((0, 0, 400, 300))
+		wm.settle(self.window)
+		self.window.get_geometry.return_value = (20, 0, 400, 300)
+		self.assertFalse(wm.is_committed(self.window, (0, 0, 400, 300)))
+
+	def test_not_committed_if_dragged_since_settled(self):
+		self.request((0, 0, 400, 300))
+		wm.settle(self.window)
+		self.window.get_geometry.return_value = (100, 50, 400, 300)
+		wm.settle(self.window)
+		self.assertFalse(wm.is_committed(self.window, (0, 0, 400, 300)))
+
+	def test_not_committed_if_new_geometry(self):
+		self.request((0, 0, 400, 300))
+		wm.settle(self.window)
+		self.assertFalse(wm.is_committed(self.window, (0, 0, 200, 300)))
+
+	def test_decoration_cached_until_invalidated(self):
+		gdk_window = MagicMock()
+		gdk_window.get_decorations.return_value = (True, 0)
+		with patch.object(wm, 'gdk_window_for', return_value=gdk_window), patch.object(wm, 'Trap'), \
+				patch.object(wm, 'decoration_delta', return_value=(0, 0, 0, 0)):
+			wm.get_decoration(self.window)
+			wm.get_decoration(self.window)
+			self.assertEqual(gdk_window.get_decorations.call_count, 1)
+
+			wm.invalidate_decoration(1)
+			wm.get_decoration(self.window)
+			self.assertEqual(gdk_window.get_decorations.call_count, 2)
+
+	def test_wrap_each_window_once(self):
+		with patch.object(wm.GdkX11.X11Window, 'foreign_new_for_display') as foreign_new:
+			first = wm.window_for(1)
+			second = wm.window_for(1)
+		foreign_new.assert_called_once()
+		self.assertIs(first, second)
+
+	def test_evict_closed_window(self):
+		with patch.object(wm.GdkX11.X11Window, 'foreign_new_for_display') as foreign_new:
+			wm.window_for(1)
+			wm.forget(1)
+			wm.window_for(1)
+		self.assertEqual(foreign_new.call_count, 2)
+
+	def test_acknowledge_awaited_configure(self):
+		callback = MagicMock()
+		wm.await_configure(1, callback)
+		wm.acknowledge_configure(1)
+		wm.acknowledge_configure(1)
+		callback.assert_called_once_with(True)
+
+	def test_expire_awaited_configure(self):
+		callback = MagicMock()
+		wm.await_configure(1, callback)
+		wm._expire_configure(1, callback)
+		wm.acknowledge_configure(1)
+		callback.assert_called_once_with(False)
+
+	def test_snapshot_window_once_per_scope(self):
+		with wm.SnapshotScope():
+			with wm.SnapshotScope():
+				wm.is_buffer(self.window)
+			wm.is_managed(self.window)
+		wm.is_buffer(self.window)
+		self.assertEqual(self.window.get_pid.call_count, 2)
+		self.assertIsNone(wm.snapshots)
+
+	def test_read_only_asked_property_outside_scope(self):
+		wm.is_buffer(self.window)
+		self.window.get_pid.assert_called_once()
+		self.window.get_geometry.assert_not_called()
+		self.window.get_name.assert_not_called()
+
+	def test_read_changed_window_again(self):
+		with wm.SnapshotScope():
+			self.window.is_minimized.return_value = False
+			self.assertTrue(wm.is_visible(self.window))
+			self.window.is_minimized.return_value = True
+			wm.forget_snapshot(self.window)
+			self.assertFalse(wm.is_visible(self.window))
+
+	def test_snapshot_is_immutable(self):
+		snapshot = wm.WindowSnapshot(self.window)
+		with self.assertRaises(AttributeError):
+			snapshot.minimized = True
+
+
+if __name__ == '__main__':
+	unittest.main()